@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import time
+from datetime import timedelta
+from pymongo import ASCENDING, AsyncMongoClient, ReplaceOne
+from model import utc_now
+
+ARCHIVE_INTERVAL = float(os.getenv('ARCHIVE_INTERVAL', '300'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+# Fraccion maxima del tiempo que el archivador pasa escribiendo: despues de cada
+# lote duerme lo necesario para no superarla, y nunca menos de ARCHIVE_PAUSE_MS
+ARCHIVE_MAX_DUTY = float(os.getenv('ARCHIVE_MAX_DUTY', '0.1'))
+ARCHIVE_PAUSE_MS = float(os.getenv('ARCHIVE_PAUSE_MS', '50'))
+SHOWTIME_RETENTION_DAYS = float(os.getenv('SHOWTIME_RETENTION_DAYS', '7'))
+NOTIFICATION_RETENTION_DAYS = float(os.getenv('NOTIFICATION_RETENTION_DAYS', '30'))
+
+# Datos frios fuera de las colecciones calientes: los Showtime ya pasados y las
+# Notification leidas hace tiempo se mueven a <coleccion>_archive. Las rutas
+# solo leen la coleccion caliente salvo con include_archived=true.
+ARCHIVES = {
+    "showtimes": "showtimes_archive",
+    "notifications": "notifications_archive",
+}
+
+def cutoff(days):
+    return (utc_now() - timedelta(days=days)).isoformat()
+
+def archivable():
+    # Filtro y orden (por un indice existente) de lo que se puede archivar
+    notification_cutoff = cutoff(NOTIFICATION_RETENTION_DAYS)
+    return {
+        "showtimes": ({"showtime": {"$lt": cutoff(SHOWTIME_RETENTION_DAYS)}}, [("showtime", ASCENDING), ("_id", ASCENDING)]),
+        "notifications": (
+            {"status": "read", "$or": [{"read_at": {"$lt": notification_cutoff}}, {"read_at": None, "showtime": {"$lt": notification_cutoff}}]},
+            [("status", ASCENDING), ("read_at", ASCENDING)],
+        ),
+    }
+
+async def move_batch(db, collection, query, sort, batch_size):
+    docs = await db[collection].find(query).sort(sort).limit(batch_size).to_list(length=batch_size)
+    if not docs:
+        return 0
+    # Copiar primero con upsert para que un lote interrumpido se pueda repetir
+    await db[ARCHIVES[collection]].bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+    # Borrar solo la version copiada: un documento actualizado entre la copia y
+    # el borrado puede seguir cumpliendo el filtro, pero ya no es el archivado
+    copied = [{"_id": doc["_id"], "version": doc.get("version")} for doc in docs]
+    result = await db[collection].delete_many({"$and": [query, {"$or": copied}]})
+    if result.deleted_count < len(docs):
+        # Lo que sigue caliente (cambiado o ya borrado por otro) no queda en el archivo
+        still_hot = await db[collection].distinct("_id", {"_id": {"$in": [doc["_id"] for doc in docs]}})
+        await db[ARCHIVES[collection]].delete_many({"_id": {"$in": still_hot}})
+    return result.deleted_count
+
+async def archive_collection(db, collection, query, sort, batch_size=ARCHIVE_BATCH_SIZE):
+    moved = 0
+    while True:
+        start = time.perf_counter()
+        count = await move_batch(db, collection, query, sort, batch_size)
+        moved += count
+        if count < batch_size:
+            return moved
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(max(ARCHIVE_PAUSE_MS / 1000, elapsed * (1 - ARCHIVE_MAX_DUTY) / ARCHIVE_MAX_DUTY))
+
+async def archive_all(db, batch_size=ARCHIVE_BATCH_SIZE):
+    moved = {}
+    for collection, (query, sort) in archivable().items():
+        moved[collection] = await archive_collection(db, collection, query, sort, batch_size)
+    return moved
+
+async def run(db):
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+        try:
+            moved = await archive_all(db)
+            if any(moved.values()):
+                print(f"Archived {', '.join(f'{count} {collection}' for collection, count in moved.items())}")
+        except Exception as e:
+            print(f"Failed to archive cold documents: {e}")
+
+async def main():
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        moved = await archive_all(client[os.getenv('MONGODB_DB_NAME', 'pro')])
+        for collection, count in moved.items():
+            print(f"Archived {count} {collection}")
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
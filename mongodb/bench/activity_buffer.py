@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pymongo import AsyncMongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from buffer import ActivityBuffer
+from model import utc_now
+import history
+
+# Throughput de logins contra un mongod local: una escritura por evento
+# (el camino por request) contra el buffer que agrupa por usuario.
+
+async def seed(db, users):
+    await db["users"].delete_many({})
+    for collection, _ in history.HISTORY.values():
+        await db[collection].delete_many({})
+    await db["users"].insert_many([{"_id": f"user-{i}", "last_login": None, "activity_log": [], "history_counts": {}} for i in range(users)])
+
+def login_event():
+    now = utc_now().isoformat()
+    return now, [{"action": "login", "timestamp": now}]
+
+async def per_request(db, user_ids, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    async def one(user_id):
+        async with semaphore:
+            now, activity = login_event()
+            await history.append(db, user_id, {"activity_log": activity})
+            await db["users"].update_one({"_id": user_id}, {"$max": {"last_login": now}})
+    await asyncio.gather(*(one(user_id) for user_id in user_ids))
+
+async def buffered(db, user_ids, flush_interval_ms):
+    activity_buffer = ActivityBuffer(db, flush_interval_ms=flush_interval_ms)
+    activity_buffer.start()
+    for user_id in user_ids:
+        now, activity = login_event()
+        await activity_buffer.record(user_id, last_login=now, activity=activity)
+    await activity_buffer.close()
+    return activity_buffer.stats()
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-request vs buffered user activity writes")
+    parser.add_argument("-e", "--events", type=int, default=50000)
+    parser.add_argument("-u", "--users", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    parser.add_argument("--flush-interval-ms", type=int, default=500)
+    args = parser.parse_args()
+
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    db = client[os.getenv('MONGODB_DB_NAME', 'pro_bench')]
+    user_ids = [f"user-{random.randrange(args.users)}" for _ in range(args.events)]
+    try:
+        await seed(db, args.users)
+        start = time.perf_counter()
+        await per_request(db, user_ids, args.concurrency)
+        direct = time.perf_counter() - start
+
+        await seed(db, args.users)
+        start = time.perf_counter()
+        stats = await buffered(db, user_ids, args.flush_interval_ms)
+        grouped = time.perf_counter() - start
+    finally:
+        await client.close()
+
+    print(f"per-request: {args.events / direct:10.0f} events/s")
+    print(f"   buffered: {args.events / grouped:10.0f} events/s  ({stats['flushed_writes']} user writes in {stats['flushed_batches']} batches)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import AsyncMongoClient, MongoClient
+
+# Lecturas por id con muchos clientes concurrentes, como las atiende el API:
+# - sync: el handler `def` con pymongo corre en el threadpool de Starlette
+#   (40 hilos por defecto), asi que los clientes de mas esperan un hilo libre
+# - async: el handler `async def` con AsyncMongoClient espera en el event loop,
+#   sin hilos de por medio, y solo compite por conexiones del pool
+# La latencia incluye la espera en cola, que es lo que ve el cliente.
+
+COLLECTION = "bench_driver"
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def report(name, latencies, elapsed):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    print(f"{name:6s} {len(latencies) / elapsed:10.1f} req/s  p50 {percentile(latencies, 0.5):8.2f} ms  p99 {percentile(latencies, 0.99):8.2f} ms  max {latencies[-1]:8.2f} ms")
+
+async def run_clients(clients, requests_per_client, documents, handler):
+    latencies = []
+    async def client(rng):
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            await handler(f"doc-{rng.randrange(documents)}")
+            latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(random.Random(i)) for i in range(clients)))
+    return latencies, time.perf_counter() - start
+
+async def main():
+    parser = argparse.ArgumentParser(description="Sync pymongo on a threadpool vs AsyncMongoClient under many concurrent clients")
+    parser.add_argument("-c", "--clients", type=int, default=500)
+    parser.add_argument("-n", "--requests", type=int, default=40, help="Requests per client")
+    parser.add_argument("-d", "--documents", type=int, default=10000)
+    parser.add_argument("-t", "--threads", type=int, default=40, help="Threadpool size of the sync handlers")
+    parser.add_argument("--pool-size", type=int, default=int(os.getenv('MONGODB_MAX_POOL_SIZE', '100')))
+    args = parser.parse_args()
+
+    uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+    db_name = os.getenv('MONGODB_DB_NAME', 'pro_bench')
+    sync_client = MongoClient(uri, maxPoolSize=args.pool_size)
+    async_client = AsyncMongoClient(uri, maxPoolSize=args.pool_size)
+    executor = ThreadPoolExecutor(max_workers=args.threads)
+    try:
+        sync_collection = sync_client[db_name][COLLECTION]
+        async_collection = async_client[db_name][COLLECTION]
+        sync_collection.drop()
+        sync_collection.insert_many([{"_id": f"doc-{i}", "title": f"Movie {i}", "duration": 90 + i % 90, "version": 1} for i in range(args.documents)])
+
+        loop = asyncio.get_running_loop()
+        async def sync_handler(id):
+            return await loop.run_in_executor(executor, sync_collection.find_one, {"_id": id})
+        async def async_handler(id):
+            return await async_collection.find_one({"_id": id})
+
+        # Una pasada corta por modo para abrir las conexiones del pool
+        await run_clients(args.clients, 1, args.documents, sync_handler)
+        await run_clients(args.clients, 1, args.documents, async_handler)
+
+        print(f"{args.clients} clients x {args.requests} requests, pool {args.pool_size}, {args.threads} sync threads")
+        report("sync", *await run_clients(args.clients, args.requests, args.documents, sync_handler))
+        report("async", *await run_clients(args.clients, args.requests, args.documents, async_handler))
+        sync_collection.drop()
+    finally:
+        executor.shutdown()
+        sync_client.close()
+        await async_client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
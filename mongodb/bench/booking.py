@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import httpx
+from pymongo import AsyncMongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import history
+
+# Reservas concurrentes sobre un solo Showtime contra un mongod local: muchos
+# clientes compiten por pocos asientos con POST /showtime/{id}/book y, una
+# fraccion (--holds), eligiendo asientos con holds + confirm. Al final se
+# comprueba que available_seats nunca bajo de cero, que coincide con lo
+# vendido en las respuestas 200 y que el mapa de asientos tiene el mismo
+# contador. Las reservas que no se confirman se liberan. Sin --url, el API corre en este mismo proceso
+# (ASGI) contra MONGODB_URI / MONGODB_DB_NAME.
+
+PREFIX = "bench-booking"
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def seed(db, seats, users):
+    await cleanup(db, users)
+    await db["theaters"].insert_one({"_id": f"{PREFIX}-theater", "name": "Bench Cinema", "location": "Bench", "seating_capacity": seats, "version": 1})
+    await db["showtimes"].insert_one({"_id": f"{PREFIX}-showtime", "movie_id": f"{PREFIX}-movie", "theater_id": f"{PREFIX}-theater",
+                                      "showtime": "2030-01-01T18:00:00", "available_seats": seats, "version": 1})
+    await db["users"].insert_many([history.split_user({"_id": f"{PREFIX}-user-{i}", "username": f"{PREFIX}-{i}", "email": f"{PREFIX}-{i}@example.com", "version": 1}) for i in range(users)])
+
+async def cleanup(db, users):
+    user_ids = [f"{PREFIX}-user-{i}" for i in range(users)]
+    await db["users"].delete_many({"_id": {"$in": user_ids}})
+    for collection, _ in history.HISTORY.values():
+        await db[collection].delete_many({"user_id": {"$in": user_ids}})
+    await db["showtimes"].delete_one({"_id": f"{PREFIX}-showtime"})
+    await db["theaters"].delete_one({"_id": f"{PREFIX}-theater"})
+    await db["seat_maps"].delete_one({"_id": f"{PREFIX}-showtime"})
+
+async def run(client, requests, concurrency, users, seats, max_quantity, holds, seed_value):
+    rng = random.Random(seed_value)
+    calls = []
+    for _ in range(requests):
+        quantity = rng.randint(1, max_quantity)
+        if rng.random() < holds:
+            calls.append((None, rng.sample(range(seats), quantity)))
+        else:
+            calls.append((f"{PREFIX}-user-{rng.randrange(users)}", quantity))
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+    async def book(user_id, quantity):
+        response = await client.post(f"/showtime/{PREFIX}-showtime/book", json={"user_id": user_id, "quantity": quantity})
+        return response.status_code, quantity
+    async def hold_and_confirm(seat_numbers):
+        response = await client.post(f"/showtime/{PREFIX}-showtime/holds", json={"seats": seat_numbers})
+        if response.status_code != 201:
+            return response.status_code, len(seat_numbers)
+        hold_id = response.json()["hold_id"]
+        response = await client.post(f"/showtime/{PREFIX}-showtime/holds/{hold_id}/confirm")
+        if response.status_code != 200:
+            await client.delete(f"/showtime/{PREFIX}-showtime/holds/{hold_id}")
+        return response.status_code, len(seat_numbers)
+    async def one(user_id, quantity):
+        async with semaphore:
+            start = time.perf_counter()
+            code, count = await (book(user_id, quantity) if user_id else hold_and_confirm(quantity))
+            results.append((code, count, time.perf_counter() - start))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*call) for call in calls))
+    return results, time.perf_counter() - start
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent bookings of a single showtime")
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=200)
+    parser.add_argument("--seats", type=int, default=500, help="Seats of the showtime; keep it below the demand to get 409s")
+    parser.add_argument("-u", "--users", type=int, default=100)
+    parser.add_argument("-q", "--max-quantity", type=int, default=4)
+    parser.add_argument("--holds", type=float, default=0.25, help="Fraction of clients that hold and confirm numbered seats")
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("--url", help="Running API to call instead of serving the app in process")
+    args = parser.parse_args()
+
+    if args.url:
+        mongodb_client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+        db = mongodb_client[os.getenv('MONGODB_DB_NAME', 'pro')]
+        client = httpx.AsyncClient(base_url=args.url, timeout=60, limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        import main as api
+        await api.startup_db_client()
+        db = api.app.database
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench", timeout=60)
+    try:
+        await seed(db, args.seats, args.users)
+        results, elapsed = await run(client, args.requests, args.concurrency, args.users, args.seats, args.max_quantity, args.holds, args.seed)
+        showtime = await db["showtimes"].find_one({"_id": f"{PREFIX}-showtime"}, {"available_seats": 1})
+        seat_map = await db["seat_maps"].find_one({"_id": f"{PREFIX}-showtime"}, {"available_seats": 1})
+        await cleanup(db, args.users)
+    finally:
+        await client.aclose()
+        if args.url:
+            await mongodb_client.close()
+        else:
+            await api.shutdown_db_client()
+
+    latencies = sorted(latency * 1000 for _, _, latency in results)
+    booked = sum(quantity for code, quantity, _ in results if code == 200)
+    conflicts = sum(1 for code, _, _ in results if code == 409)
+    errors = [code for code, _, _ in results if code not in (200, 409)]
+    print(f"{len(results)} bookings in {elapsed:.2f}s: {len(results) / elapsed:.1f} req/s  p50 {percentile(latencies, 0.5):.2f} ms  p99 {percentile(latencies, 0.99):.2f} ms")
+    print(f"{booked} seats booked, {conflicts} rejected with 409, {len(errors)} other errors, {showtime['available_seats']} seats left of {args.seats}")
+    if showtime["available_seats"] < 0:
+        sys.exit(f"Oversold: available_seats is {showtime['available_seats']}")
+    if showtime["available_seats"] != args.seats - booked:
+        sys.exit(f"Lost update: {args.seats - booked} seats should be left, found {showtime['available_seats']}")
+    if seat_map is not None and seat_map["available_seats"] != showtime["available_seats"]:
+        sys.exit(f"Seat map counter is {seat_map['available_seats']}, showtime has {showtime['available_seats']}")
+    if errors:
+        sys.exit(f"Unexpected status codes: {sorted(set(errors))}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import sys
+from datetime import timedelta
+from pymongo import AsyncMongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+from indexes import ensure_indexes
+from routes import showtime_query
+import generate
+
+SHOWTIME_SORT = [("showtime", 1), ("_id", 1)]
+
+# Comprueba con explain() que las consultas calientes del API usan el indice
+# esperado (IXSCAN, sin COLLSCAN ni SORT en memoria) contra un mongod local.
+# Las consultas de showtimes salen de showtime_query, la misma funcion que usan
+# las rutas. Si las colecciones estan casi vacias se cargan datos de
+# data/generate.py para que el planificador tenga algo que comparar.
+
+def checks():
+    user_id = generate.make_id("user", 1)
+    movie_id = generate.make_id("movie", 0)
+    theater_id = generate.make_id("theater", 0)
+    last = (generate.BASE_DATE + timedelta(hours=18)).isoformat()
+    after = {"$or": [{"showtime": {"$gt": last}}, {"showtime": last, "_id": {"$gt": ""}}]}
+    return [
+        ("users by email", "users", {"email": "user_1@example.com"}, None, {"email": 1}),
+        ("users by username", "users", {"username": "user_1"}, None, {"username": 1}),
+        ("showtimes by movie", "showtimes", showtime_query(movie_id=movie_id), SHOWTIME_SORT, {"movie_id": 1, "showtime": 1, "_id": 1}),
+        ("showtimes by movie, next page", "showtimes", {**showtime_query(movie_id=movie_id), **after}, SHOWTIME_SORT, {"movie_id": 1, "showtime": 1, "_id": 1}),
+        ("showtimes by theater", "showtimes", showtime_query(theater_id=theater_id), SHOWTIME_SORT, {"theater_id": 1, "showtime": 1, "_id": 1}),
+        ("showtimes by date", "showtimes", showtime_query(from_=generate.BASE_DATE, to=generate.BASE_DATE + timedelta(days=7)), SHOWTIME_SORT, {"showtime": 1, "_id": 1}),
+        ("notifications unread by user", "notifications", {"user_id": user_id, "status": "unread"}, None, {"user_id": 1, "status": 1}),
+    ]
+
+def plan_stages(plan):
+    # Recorre el plan ganador; en SBE viene dentro de queryPlan
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan
+    for key in ("queryPlan", "inputStage"):
+        yield from plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+def check_plan(explain, key_pattern, sorted_query):
+    stages = list(plan_stages(explain["queryPlanner"]["winningPlan"]))
+    names = [stage.get("stage") for stage in stages]
+    problems = []
+    if "COLLSCAN" in names:
+        problems.append("COLLSCAN")
+    scans = [stage for stage in stages if stage.get("stage") == "IXSCAN"]
+    if not scans:
+        problems.append("no IXSCAN")
+    problems += [f"IXSCAN on {stage.get('indexName')}" for stage in scans if dict(stage.get("keyPattern", {})) != key_pattern]
+    if sorted_query and "SORT" in names:
+        problems.append("in-memory SORT")
+    return names, problems
+
+async def ensure_dataset(db, count, seed):
+    counts = {"movies": max(100, count // 20), "theaters": max(10, count // 1000), "showtimes": count, "users": count, "notifications": count * 2}
+    for kind in ["users", "showtimes", "notifications"]:
+        if await db[kind].estimated_document_count() < counts[kind] // 2:
+            await db[kind].delete_many({})
+            await generate.load(db, kind, counts[kind], seed, counts, batch_size=1000, in_flight=4)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Check with explain() that hot queries use their indexes")
+    parser.add_argument("-n", "--count", type=int, default=20000, help="Documents to generate when a collection is nearly empty")
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    failures = 0
+    try:
+        db = client[os.getenv('MONGODB_DB_NAME', 'pro_bench')]
+        await ensure_indexes(db)
+        await ensure_dataset(db, args.count, args.seed)
+        for name, collection, query, sort, key_pattern in checks():
+            cursor = db[collection].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            names, problems = check_plan(await cursor.explain(), key_pattern, sort is not None)
+            failures += bool(problems)
+            print(f"{'FAIL' if problems else 'ok':4s} {name:32s} {' <- '.join(reversed(names))}{'  (' + ', '.join(problems) + ')' if problems else ''}")
+    finally:
+        await client.close()
+    if failures:
+        sys.exit(f"{failures} queries do not use their index")
+
+if __name__ == "__main__":
+    asyncio.run(main())
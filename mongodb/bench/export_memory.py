@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from pymongo import AsyncMongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+from model import Movie, Notification, Showtime, Theater, User
+from repository import export_ndjson
+import generate
+
+MODELS = {"users": User, "movies": Movie, "showtimes": Showtime, "theaters": Theater, "notifications": Notification}
+
+# Memoria de /<entidad>/export sobre un dataset grande de data/generate.py: se
+# consume el mismo StreamingResponse que devuelve la ruta y se muestrea el RSS
+# del proceso en cada bloque. Si el export acumulara documentos, el RSS creceria
+# con el tamano de la coleccion; con streaming se queda plano. Ademas se mide el
+# pico de tracemalloc durante la pasada, que no depende de lo que el allocator
+# devuelva o no al sistema.
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as fd:
+            for line in fd:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sin /proc solo queda el pico (KB en Linux, bytes en macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+async def ensure_dataset(db, collection, count, seed):
+    existing = await db[collection].estimated_document_count()
+    if existing >= count:
+        print(f"Reusing {existing} {collection}")
+        return
+    await db[collection].delete_many({})
+    counts = {"movies": max(100, count // 20), "theaters": max(10, count // 1000), "showtimes": count, "users": count, "notifications": count}
+    await generate.load(db, collection, count, seed, counts, batch_size=1000, in_flight=4)
+
+async def warm_up(db, collection, chunks):
+    # Solo los primeros bloques: abre conexiones y carga imports perezosos sin
+    # recorrer la coleccion, para que un export que acumule no infle la base
+    body = export_ndjson(db[collection], MODELS[collection]).body_iterator
+    try:
+        for _ in range(chunks):
+            if await anext(body, None) is None:
+                break
+    finally:
+        await body.aclose()
+
+async def stream(db, collection):
+    response = export_ndjson(db[collection], MODELS[collection])
+    samples = []
+    lines = 0
+    size = 0
+    start = time.perf_counter()
+    async for chunk in response.body_iterator:
+        lines += chunk.count(b"\n")
+        size += len(chunk)
+        samples.append(rss_mb())
+    return lines, size, time.perf_counter() - start, samples
+
+async def main():
+    parser = argparse.ArgumentParser(description="RSS of the NDJSON export while streaming a large collection")
+    parser.add_argument("collection", nargs="?", default="showtimes", choices=sorted(MODELS))
+    parser.add_argument("-n", "--count", type=int, default=1_000_000, help="Documents to generate when the collection is smaller")
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("--max-growth-mb", type=float, default=64, help="Fail when RSS grows more than this while streaming")
+    parser.add_argument("--max-traced-mb", type=float, default=32, help="Fail when the tracemalloc peak exceeds this while streaming")
+    parser.add_argument("--warm-up-chunks", type=int, default=2, help="Chunks read before taking the RSS baseline")
+    args = parser.parse_args()
+
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        db = client[os.getenv('MONGODB_DB_NAME', 'pro_bench')]
+        await ensure_dataset(db, args.collection, args.count, args.seed)
+        await warm_up(db, args.collection, args.warm_up_chunks)
+        baseline = rss_mb()
+        tracemalloc.start()
+        try:
+            lines, size, elapsed, samples = await stream(db, args.collection)
+            traced_peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    finally:
+        await client.close()
+
+    peak = max(samples, default=baseline)
+    quarter = max(1, len(samples) // 4)
+    print(f"Streamed {lines} {args.collection} ({size / 1024 / 1024:.1f} MB) in {elapsed:.1f}s ({lines / max(elapsed, 1e-9):.0f} docs/s)")
+    print(f"RSS baseline {baseline:.1f} MB, peak {peak:.1f} MB, growth {peak - baseline:+.1f} MB")
+    if samples:
+        print(f"RSS first quarter {max(samples[:quarter]):.1f} MB, last quarter {max(samples[-quarter:]):.1f} MB")
+    print(f"tracemalloc peak {traced_peak:.1f} MB")
+    if peak - baseline > args.max_growth_mb:
+        sys.exit(f"RSS grew {peak - baseline:.1f} MB while streaming (limit {args.max_growth_mb} MB)")
+    if traced_peak > args.max_traced_mb:
+        sys.exit(f"tracemalloc peak {traced_peak:.1f} MB while streaming (limit {args.max_traced_mb} MB)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
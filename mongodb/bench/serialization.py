@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from model import User
+from repository import dump_json
+
+# Compara la serializacion de una pagina de User: serialize_response con el campo
+# de response_model, como la llama FastAPI en una ruta sin response_class propia
+# (validacion + serialize_json de pydantic), contra el camino rapido de repository.
+
+def make_users(count):
+    return [{
+        "_id": f"user-{i}",
+        "username": f"user_{i}",
+        "email": f"user_{i}@example.com",
+        "hashed_password": "$2b$12$Qb45tFD/C4G2pRZ1kR3.yzJ9z9sdghsPJ6v/xwTraDnBqLGJHvUmz",
+        "created_at": "2022-09-10T12:25:00",
+        "last_login": "2024-11-19T15:30:00",
+        "preferences": ["Romance", "Comedy", "Drama"],
+        "activity_log": [{"action": "login", "timestamp": "2024-11-19T15:35:00Z"}] * 5,
+        "watchlist": ["Inception", "Interstellar"],
+        "deactivated_at": None,
+        "tier": "gold",
+        "feedback": [{"feedback_text": "Great service!", "rating": 5, "timestamp": "2024-11-20T15:35:00Z"}],
+        "booking_history": [{"movie_id": "m1", "showtime_id": "s1", "theater_id": "t1", "booking_date": "2024-11-19T18:00:00Z"}] * 3,
+        "rating_reviews": [{"movie_id": "m1", "rating": 5, "review_text": "Amazing movie!", "timestamp": "2024-11-20T18:00:00Z"}],
+    } for i in range(count)]
+
+def current_path(field, docs):
+    return asyncio.run(serialize_response(field=field, response_content=docs, dump_json=True))
+
+def fast_path(docs):
+    return dump_json(docs)
+
+def measure(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization throughput for a page of User documents")
+    parser.add_argument("-n", "--count", type=int, default=10000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_users(args.count)
+    field = create_model_field(name="Response_list_users", type_=List[User], mode="serialization")
+    results = {
+        "current": measure(lambda: current_path(field, docs), args.repeat),
+        "fast": measure(lambda: fast_path(docs), args.repeat),
+    }
+    for name, seconds in results.items():
+        print(f"{name:>8}: {seconds * 1000:8.1f} ms  {args.count / seconds:12.0f} docs/s")
+    print(f" speedup: {results['current'] / results['fast']:.1f}x")
+
+if __name__ == "__main__":
+    main()
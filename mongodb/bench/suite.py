@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+import generate
+
+BASE_URL = os.getenv("API_URL", "http://localhost:8000")
+ENTITIES = {
+    "user": ("users", generate.make_user),
+    "movie": ("movies", lambda rng, i, counts: generate.make_movie(rng, i)),
+    "showtime": ("showtimes", generate.make_showtime),
+    "theater": ("theaters", lambda rng, i, counts: generate.make_theater(rng, i)),
+    "notification": ("notifications", generate.make_notification),
+}
+
+# Carga contra un API en marcha (idealmente sobre los datos de data/generate.py):
+# cada escenario lanza N requests con C hilos y registra throughput y percentiles
+# de latencia. Los escenarios de escritura crean, actualizan y borran sus propios
+# documentos, asi que el dataset queda igual. El resultado es un JSON para
+# comparar una corrida con otra (--compare).
+# El archivador del API mueve los Showtime con mas de SHOWTIME_RETENTION_DAYS y
+# las notificaciones leidas: los datos de data/generate.py se fechan alrededor
+# de hoy para que siga habiendo datos calientes, pero para que el dataset no
+# cambie entre corridas conviene arrancar el API con ARCHIVE_ENABLED=false.
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def call(session, method, path, body=None):
+    start = time.perf_counter()
+    try:
+        response = session.request(method, f"{BASE_URL}{path}", json=body)
+        ok = response.status_code < 400
+    except requests.RequestException:
+        ok = False
+    return time.perf_counter() - start, ok
+
+def run_scenario(session, executor, name, calls):
+    start = time.perf_counter()
+    results = list(executor.map(lambda args: call(session, *args), calls))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    summary = {
+        "requests": len(results),
+        "errors": errors,
+        "throughput_rps": round(len(results) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            **{key: round(percentile(latencies, fraction), 3) if latencies else None for key, fraction in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99)]},
+            "max": round(latencies[-1], 3) if latencies else None,
+        },
+    }
+    print(f"{name:28s} {summary['throughput_rps'] or 0:10.1f} req/s  p50 {summary['latency_ms']['p50'] or 0:8.2f} ms  p99 {summary['latency_ms']['p99'] or 0:8.2f} ms  errors {errors}")
+    return summary
+
+def sample_ids(session, entity, count):
+    response = session.get(f"{BASE_URL}/{entity}/", params={"limit": min(count, 1000), "fields": "_id"})
+    response.raise_for_status()
+    return [doc["_id"] for doc in response.json()]
+
+def scenarios(session, rng, requests_per_scenario, run_id):
+    counts = {}
+    ids = {}
+    for entity, (collection, _) in ENTITIES.items():
+        ids[entity] = sample_ids(session, entity, 1000)
+        counts[collection] = max(1, len(ids[entity]))
+    pick = lambda entity: rng.choice(ids[entity])
+    for entity, (collection, make) in ENTITIES.items():
+        yield f"{entity}.list", [("GET", f"/{entity}/?limit=100")] * requests_per_scenario
+        if ids[entity]:
+            yield f"{entity}.get", [("GET", f"/{entity}/{pick(entity)}") for _ in range(requests_per_scenario)]
+        created = []
+        for i in range(requests_per_scenario):
+            doc = make(rng, i, counts)
+            doc.pop("version", None)
+            doc["_id"] = f"bench-{run_id}-{entity}-{i}"
+            if entity == "user":
+                doc["email"] = f"bench-{run_id}-{i}@example.com"
+            created.append(doc)
+        yield f"{entity}.create", [("POST", f"/{entity}/", doc) for doc in created]
+        yield f"{entity}.update", [("PUT", f"/{entity}/{doc['_id']}", doc) for doc in created]
+        yield f"{entity}.delete", [("DELETE", f"/{entity}/{doc['_id']}") for doc in created]
+    yield "schedule.list", [("GET", "/schedule/?limit=50")] * requests_per_scenario
+    yield "movie.list_by_rating", [("GET", "/movie/?sort=rating&limit=50")] * requests_per_scenario
+    if ids["user"]:
+        yield "user.activity", [("GET", f"/user/{pick('user')}/activity?limit=50") for _ in range(requests_per_scenario)]
+        yield "user.recommendations", [("GET", f"/user/{pick('user')}/recommendations") for _ in range(requests_per_scenario)]
+
+def compare(previous, current):
+    print(f"\nCompared with {previous.get('commit') or 'previous run'}:")
+    for name, result in current["results"].items():
+        if (before := previous.get("results", {}).get(name)) is None:
+            continue
+        def change(old, new):
+            return f"{(new - old) / old * 100:+7.1f}%" if old and new is not None else "    n/a"
+        print(f"{name:28s} throughput {change(before['throughput_rps'], result['throughput_rps'])}  p99 {change(before['latency_ms']['p99'], result['latency_ms']['p99'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent CRUD and list benchmark for every router")
+    parser.add_argument("-n", "--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=32)
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", default="bench-results.json")
+    parser.add_argument("--only", help="Comma separated scenario prefixes, for example movie,schedule")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    only = [prefix.strip() for prefix in args.only.split(",")] if args.only else None
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {"url": BASE_URL, "requests": args.requests, "concurrency": args.concurrency, "seed": args.seed},
+        "results": {},
+    }
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=args.concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        for name, calls in scenarios(session, rng, args.requests, run_id):
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            report["results"][name] = run_scenario(session, executor, name, calls)
+
+    with open(args.output, "w") as fd:
+        json.dump(report, fd, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as fd:
+            compare(json.load(fd), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import time
+from pymongo import AsyncMongoClient, ReturnDocument
+
+# Latencia por escritura contra un mongod local con las operaciones que hace
+# cada camino, sin HTTP de por medio:
+# - before: create con insert_one + find_one y update con update_one + find_one
+#   (los handlers anteriores a repository.Repository)
+# - after: create con solo insert_one y update con un find_one_and_update que
+#   devuelve el documento (Repository.create / Repository.update)
+
+COLLECTION = "bench_writes"
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def document(run, i):
+    return {"_id": f"{run}-{i}", "title": f"Movie {i}", "genre": "Drama", "duration": 90 + i % 90, "description": "Bench", "version": 1}
+
+async def create_before(collection, doc):
+    result = await collection.insert_one(doc)
+    return await collection.find_one({"_id": result.inserted_id})
+
+async def create_after(collection, doc):
+    await collection.insert_one(doc)
+    return doc
+
+async def update_before(collection, doc):
+    result = await collection.update_one({"_id": doc["_id"]}, {"$set": {"duration": doc["duration"] + 1}})
+    if result.modified_count == 1:
+        return await collection.find_one({"_id": doc["_id"]})
+
+async def update_after(collection, doc):
+    return await collection.find_one_and_update(
+        {"_id": doc["_id"]}, {"$set": {"duration": doc["duration"] + 1}, "$inc": {"version": 1}}, return_document=ReturnDocument.AFTER
+    )
+
+async def measure(name, write, collection, docs, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    async def one(doc):
+        async with semaphore:
+            start = time.perf_counter()
+            await write(collection, doc)
+            latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    await asyncio.gather(*(one(doc) for doc in docs))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{name:14s} {len(latencies) / elapsed:10.1f} writes/s  p50 {percentile(latencies, 0.5):7.3f} ms  p99 {percentile(latencies, 0.99):7.3f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-write latency of the old read-back write path vs single round trip writes")
+    parser.add_argument("-n", "--writes", type=int, default=5000)
+    parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 32])
+    args = parser.parse_args()
+
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        collection = client[os.getenv('MONGODB_DB_NAME', 'pro_bench')][COLLECTION]
+        for concurrency in args.concurrency:
+            print(f"concurrency {concurrency}")
+            for path, create, update in [("before", create_before, update_before), ("after", create_after, update_after)]:
+                await collection.drop()
+                docs = [document(path, i) for i in range(args.writes)]
+                await measure(f"{path} create", create, collection, docs, concurrency)
+                await measure(f"{path} update", update, collection, docs, concurrency)
+        await collection.drop()
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
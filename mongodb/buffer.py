@@ -0,0 +1,140 @@
+import asyncio
+import os
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import history
+
+FLUSH_INTERVAL_MS = int(os.getenv('ACTIVITY_FLUSH_INTERVAL_MS', '500'))
+MAX_PENDING = int(os.getenv('ACTIVITY_MAX_PENDING', '1000'))
+
+# Buffer de escrituras para los campos calientes de User (last_login y activity_log).
+# Las actualizaciones se combinan por usuario y se escriben juntas en un solo
+# bulk_write desordenado, como maximo cada FLUSH_INTERVAL_MS o al llegar a
+# MAX_PENDING usuarios pendientes. Lo pendiente se pierde si el proceso muere
+# sin pasar por close(), asi que FLUSH_INTERVAL_MS es la ventana de durabilidad.
+# Si un flush falla, lo no escrito queda en el buffer para el siguiente; un
+# error de red a mitad del bulk_write puede hacer que se aplique dos veces.
+class ActivityBuffer:
+    def __init__(self, db, flush_interval_ms=FLUSH_INTERVAL_MS, max_pending=MAX_PENDING):
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self.pending = {}
+        # Actividad de usuarios ya actualizados cuyos buckets falta escribir
+        self.pending_histories = []
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.flushed_writes = 0
+        self.flushed_batches = 0
+        self.dropped_users = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # shield: cancelar el task en close() no corta un flush a medias
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"Failed to flush user activity: {e}")
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        # Espera por el lock a un flush en curso antes de escribir lo que queda
+        await self.flush()
+
+    def add(self, user_id, last_login, activity, older=False):
+        entry = self.pending.setdefault(user_id, {"last_login": None, "activity": []})
+        if last_login is not None and (entry["last_login"] is None or last_login > entry["last_login"]):
+            entry["last_login"] = last_login
+        entry["activity"] = [*activity, *entry["activity"]] if older else [*entry["activity"], *activity]
+
+    async def record(self, user_id, last_login=None, activity=()):
+        self.add(user_id, last_login, activity)
+        if len(self.pending) >= self.max_pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                # El evento ya quedo en el buffer; el siguiente flush lo reintenta
+                print(f"Failed to flush user activity: {e}")
+
+    async def flush(self):
+        async with self.lock:
+            pending, self.pending = self.pending, {}
+            try:
+                if pending:
+                    await self.write_users(pending)
+                if self.pending_histories:
+                    await self.write_histories()
+            finally:
+                # Lo que no se escribio vuelve al buffer, antes de lo registrado mientras tanto
+                for user_id, entry in pending.items():
+                    self.add(user_id, entry["last_login"], entry["activity"], older=True)
+
+    async def write_users(self, pending):
+        # Saca de `pending` cada usuario escrito o descartado; lo que quede se reintenta
+        await history.migrate_legacy(self.db, list(pending))
+        existing = set(await self.db["users"].distinct("_id", {"_id": {"$in": list(pending)}}))
+        for user_id in [user_id for user_id in pending if user_id not in existing]:
+            # Ids que no son de ningun usuario: no crear buckets huerfanos
+            del pending[user_id]
+            self.dropped_users += 1
+        if not pending:
+            return
+        user_ids = list(pending)
+        user_updates = []
+        for user_id in user_ids:
+            entry = pending[user_id]
+            if entry["activity"]:
+                update = history.summary_update({"activity_log": entry["activity"]})
+            else:
+                update = {"$inc": {"version": 1}}
+            if entry["last_login"] is not None:
+                update["$max"] = {"last_login": entry["last_login"]}
+            user_updates.append(UpdateOne({"_id": user_id, **history.MIGRATED}, update))
+        error = None
+        try:
+            await self.db["users"].bulk_write(user_updates, ordered=False)
+        except BulkWriteError as e:
+            error = e
+        failed = {write_error["index"] for write_error in error.details["writeErrors"]} if error else set()
+        for index, user_id in enumerate(user_ids):
+            if index not in failed:
+                entry = pending.pop(user_id)
+                if entry["activity"]:
+                    self.pending_histories.append((user_id, {"activity_log": entry["activity"]}))
+        self.flushed_writes += len(user_ids) - len(failed)
+        self.flushed_batches += 1
+        if error:
+            raise error
+
+    async def write_histories(self):
+        # Como en write_users: solo vuelven a pending_histories los trozos que fallaron
+        histories, self.pending_histories = self.pending_histories, []
+        try:
+            writes = await history.bucket_writes(self.db, histories)
+        except Exception:
+            self.pending_histories = histories
+            raise
+        error = None
+        for collection, (ops, chunks) in writes.items():
+            try:
+                await self.db[collection].bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                error = e
+                self.pending_histories += [chunks[write_error["index"]] for write_error in e.details["writeErrors"]]
+            except Exception as e:
+                error = e
+                self.pending_histories += chunks
+        if error:
+            raise error
+
+    def stats(self):
+        return {"pending_users": len(self.pending), "flushed_writes": self.flushed_writes, "flushed_batches": self.flushed_batches, "dropped_users": self.dropped_users}
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+CACHE_URL = os.getenv('CACHE_URL', 'redis://localhost:6379/0')
+CACHE_MAX_SIZE = int(os.getenv('CACHE_MAX_SIZE', '10000'))
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '300'))
+
+# Cache de lectura para documentos del catalogo (movies, theaters).
+# Las escrituras invalidan la clave; un contador de generacion por clave evita
+# que una lectura lenta vuelva a guardar un documento que ya fue invalidado.
+# Solo se guarda mientras hay cargas en curso de esa clave: [cargas, generacion].
+class Cache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loading = {}
+
+    async def get_or_load(self, key, loader):
+        if (value := await self.get(key)) is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        state = self.loading.setdefault(key, [0, 0])
+        state[0] += 1
+        generation = state[1]
+        try:
+            value = await loader()
+        finally:
+            state[0] -= 1
+            if state[0] == 0:
+                del self.loading[key]
+        if value is not None and state[1] == generation:
+            await self.set(key, value)
+        return value
+
+    async def invalidate(self, key):
+        if (state := self.loading.get(key)) is not None:
+            state[1] += 1
+        await self.delete(key)
+
+    def stats(self):
+        return {"backend": type(self).__name__, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+class NullCache(Cache):
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value):
+        pass
+
+    async def delete(self, key):
+        pass
+
+class TTLCache(Cache):
+    def __init__(self, max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL_SECONDS):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    async def get(self, key):
+        if (entry := self.entries.get(key)) is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            self.evictions += 1
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key):
+        self.entries.pop(key, None)
+
+    def stats(self):
+        return {**super().stats(), "size": len(self.entries), "max_size": self.max_size}
+
+class SharedCache(Cache):
+    # Cualquier cliente con get/set(ex=)/delete asincronos, por ejemplo redis.asyncio.Redis
+    def __init__(self, client, ttl=CACHE_TTL_SECONDS):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+
+    async def get(self, key):
+        value = await self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key, value):
+        await self.client.set(key, json.dumps(value, default=str), ex=max(1, int(self.ttl)))
+
+    async def delete(self, key):
+        await self.client.delete(key)
+
+def build_cache():
+    if CACHE_BACKEND == 'none':
+        return NullCache()
+    if CACHE_BACKEND == 'redis':
+        import redis.asyncio
+        return SharedCache(redis.asyncio.Redis.from_url(CACHE_URL))
+    return TTLCache()
@@ -24,13 +24,19 @@ def list_items(item_type, genre=None):
     suffix = f"/{item_type}"
     endpoint = API_URL + suffix
     params = {"genre": genre} if genre else {}
-    response = requests.get(endpoint, params=params)
-    if response.ok:
+    while True:
+        response = requests.get(endpoint, params=params)
+        if not response.ok:
+            print(f"Error: {response}")
+            return
         json_resp = response.json()
         for item in json_resp:
             print_item(item)
-    else:
-        print(f"Error: {response}")
+        # Seguir el cursor hasta la ultima pagina
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            return
+        params["after"] = next_cursor
 
 def get_item_by_id(item_type, id):
     suffix = f"/{item_type}/{id}"
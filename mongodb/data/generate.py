@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pymongo import AsyncMongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from indexes import ensure_indexes
+from model import utc_now
+import history
+import ratings
+import recommendations
+
+# Datos sinteticos reproducibles (misma semilla y --base-date, mismos documentos)
+# cargados directamente en mongod con la forma que les da el API: fechas ISO,
+# `version`, historiales de User en buckets y el resumen reciente en el documento.
+# Las fechas se reparten alrededor de BASE_DATE, hoy por defecto: con una fecha
+# fija el archivador del API (ARCHIVE_ENABLED) acabaria moviendo todo el dataset.
+# Los arreglos de User tienen cola pesada: la mayoria casi vacios y unos pocos
+# usuarios con miles de entradas.
+
+BASE_DATE = utc_now().replace(hour=0, minute=0, second=0, microsecond=0)
+GENRES = ["Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama", "Family", "Fantasy",
+          "Horror", "Musical", "Mystery", "Romance", "Sci-Fi", "Thriller", "War", "Western"]
+LOCATIONS = ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix", "Philadelphia", "San Antonio", "San Diego",
+             "Dallas", "Austin", "Seattle", "Denver", "Boston", "Miami", "Atlanta", "Portland"]
+WORDS = ["Night", "City", "Lost", "Dark", "Star", "River", "Last", "Silent", "Red", "Iron", "Golden", "Broken",
+         "Secret", "Wild", "Frozen", "Hidden", "Storm", "Shadow", "Empire", "Dream", "Road", "Heart", "Fire", "Sky"]
+ACTIONS = ["login", "search", "view_movie", "add_watchlist", "book", "logout"]
+TIERS = ["free", "silver", "gold", "platinum"]
+NAMESPACE = uuid.UUID("6f1c2d1e-5a55-4f5b-9a52-2b1e7f0c9d10")
+
+def make_id(kind, i):
+    return str(uuid.uuid5(NAMESPACE, f"{kind}-{i}"))
+
+def heavy_tail(rng, cap, alpha=1.3):
+    # Pareto desplazado: mediana de 0 o 1 entradas, cola hasta `cap`
+    return min(cap, int(rng.paretovariate(alpha)) - 1)
+
+def popular(rng, count):
+    # Indices sesgados hacia los primeros (unas pocas peliculas concentran la demanda)
+    return int(count * rng.random() ** 3)
+
+def timestamp(rng, days_back=365):
+    return (BASE_DATE - timedelta(seconds=rng.randrange(days_back * 86400))).isoformat()
+
+def make_movie(rng, i):
+    return {
+        "_id": make_id("movie", i),
+        "title": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+        "genre": rng.choice(GENRES),
+        "duration": rng.randint(80, 200),
+        "description": " ".join(rng.choices(WORDS, k=rng.randint(8, 40))),
+        "version": 1,
+    }
+
+def make_theater(rng, i):
+    return {
+        "_id": make_id("theater", i),
+        "name": f"{rng.choice(WORDS)} Cinema {i}",
+        "location": rng.choice(LOCATIONS),
+        "seating_capacity": rng.choice([80, 120, 150, 200, 250, 300, 400]),
+        "version": 1,
+    }
+
+def make_showtime(rng, i, counts):
+    capacity = rng.choice([80, 120, 150, 200, 250, 300, 400])
+    return {
+        "_id": make_id("showtime", i),
+        "movie_id": make_id("movie", popular(rng, counts["movies"])),
+        "theater_id": make_id("theater", rng.randrange(counts["theaters"])),
+        "showtime": (BASE_DATE + timedelta(days=rng.randint(-90, 90), hours=rng.choice([12, 15, 18, 21]))).isoformat(),
+        "available_seats": rng.randint(0, capacity),
+        "version": 1,
+    }
+
+def make_user(rng, i, counts):
+    movies = counts["movies"]
+    return {
+        "_id": make_id("user", i),
+        "username": f"user_{i}",
+        "email": f"user_{i}@example.com",
+        "hashed_password": "$2b$12$Qb45tFD/C4G2pRZ1kR3.yzJ9z9sdghsPJ6v/xwTraDnBqLGJHvUmz",
+        "created_at": timestamp(rng, 1500),
+        "last_login": timestamp(rng, 30),
+        "preferences": rng.sample(GENRES, rng.randint(0, 4)),
+        "activity_log": [{"action": rng.choice(ACTIONS), "timestamp": timestamp(rng)} for _ in range(heavy_tail(rng, 5000, 1.1))],
+        "watchlist": [make_id("movie", popular(rng, movies)) for _ in range(heavy_tail(rng, 200))],
+        "deactivated_at": timestamp(rng) if rng.random() < 0.02 else None,
+        "tier": rng.choice(TIERS),
+        "feedback": [{"feedback_text": " ".join(rng.choices(WORDS, k=6)), "rating": rng.randint(1, 5), "timestamp": timestamp(rng)} for _ in range(heavy_tail(rng, 50, 2))],
+        "booking_history": [
+            {"movie_id": make_id("movie", popular(rng, movies)), "showtime_id": make_id("showtime", rng.randrange(counts["showtimes"])),
+             "theater_id": make_id("theater", rng.randrange(counts["theaters"])), "booking_date": timestamp(rng)}
+            for _ in range(heavy_tail(rng, 1000))
+        ],
+        "rating_reviews": [
+            {"movie_id": make_id("movie", popular(rng, movies)), "rating": rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 5, 4])[0],
+             "review_text": " ".join(rng.choices(WORDS, k=10)), "timestamp": timestamp(rng)}
+            for _ in range(heavy_tail(rng, 500))
+        ],
+    }
+
+def make_notification(rng, i, counts):
+    return {
+        "_id": make_id("notification", i),
+        "user_id": make_id("user", rng.randrange(counts["users"])),
+        "movie_id": make_id("movie", popular(rng, counts["movies"])),
+        "showtime": (BASE_DATE + timedelta(days=rng.randint(-90, 90))).isoformat(),
+        "status": "read" if rng.random() < 0.7 else "unread",
+        "version": 1,
+    }
+
+def generate(kind, count, seed, counts):
+    # Cada coleccion usa su propia semilla: cambiar un conteo no altera las demas
+    rng = random.Random(f"{seed}-{kind}")
+    for i in range(count):
+        if kind == "movies":
+            yield make_movie(rng, i)
+        elif kind == "theaters":
+            yield make_theater(rng, i)
+        elif kind == "showtimes":
+            yield make_showtime(rng, i, counts)
+        elif kind == "users":
+            yield make_user(rng, i, counts)
+        else:
+            yield make_notification(rng, i, counts)
+
+async def load_users(db, users):
+    operations = {}
+    for user in users:
+        for field, (collection, _) in history.HISTORY.items():
+            operations.setdefault(collection, []).extend(history.sealed_buckets(user["_id"], field, user[field]))
+    for collection, ops in operations.items():
+        if ops:
+            await db[collection].bulk_write(ops, ordered=False)
+    await db["users"].insert_many([{**history.split_user(user), "version": 1} for user in users], ordered=False)
+
+async def load(db, kind, count, seed, counts, batch_size, in_flight):
+    start = time.perf_counter()
+    pending = set()
+    batch = []
+    async def write(docs):
+        if kind == "users":
+            await load_users(db, docs)
+        else:
+            await db[kind].insert_many(docs, ordered=False)
+    for doc in generate(kind, count, seed, counts):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            pending.add(asyncio.ensure_future(write(batch)))
+            batch = []
+            if len(pending) >= in_flight:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+    if batch:
+        pending.add(asyncio.ensure_future(write(batch)))
+    if pending:
+        done, _ = await asyncio.wait(pending)
+        for task in done:
+            task.result()
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {count} {kind} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} docs/s)")
+
+async def main():
+    global BASE_DATE
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic dataset and load it into MongoDB")
+    parser.add_argument("-u", "--users", type=int, default=10000, help="Number of users; the other collections scale from it")
+    parser.add_argument("--movies", type=int, help="Defaults to users / 20")
+    parser.add_argument("--theaters", type=int, help="Defaults to users / 1000")
+    parser.add_argument("--showtimes", type=int, help="Defaults to users")
+    parser.add_argument("--notifications", type=int, help="Defaults to users * 2")
+    parser.add_argument("-s", "--seed", type=int, default=42)
+    parser.add_argument("-b", "--batch-size", type=int, default=1000)
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Batches kept in flight at once")
+    parser.add_argument("--drop", action="store_true", help="Drop the generated collections before loading")
+    parser.add_argument("--base-date", type=datetime.fromisoformat, default=BASE_DATE, help="Date the generated dates are spread around; defaults to today (UTC)")
+    args = parser.parse_args()
+    BASE_DATE = args.base_date
+
+    counts = {
+        "movies": args.movies or max(100, args.users // 20),
+        "theaters": args.theaters or max(10, args.users // 1000),
+        "showtimes": args.showtimes or args.users,
+        "users": args.users,
+        "notifications": args.notifications if args.notifications is not None else args.users * 2,
+    }
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        db = client[os.getenv('MONGODB_DB_NAME', 'pro')]
+        if args.drop:
+            for collection in [*counts, *(collection for collection, _ in history.HISTORY.values()), ratings.MOVIE_STATS, recommendations.RECOMMENDATIONS, "seat_maps", "collection_versions"]:
+                await db.drop_collection(collection)
+        await ensure_indexes(db)
+        for kind, count in counts.items():
+            await load(db, kind, count, args.seed, counts, args.batch_size, args.workers)
+        rebuilt, _ = await ratings.rebuild(db)
+        print(f"Rebuilt rating stats for {rebuilt} movies")
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,69 +1,89 @@
 #!/usr/bin/env python3
+import argparse
 import csv
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
 import requests
+from requests.adapters import HTTPAdapter
 
-BASE_URL = "http://localhost:8000"
+BASE_URL = os.getenv("API_URL", "http://localhost:8000")
+CSV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "csv")
+JSON_FIELDS = ["activity_log", "watchlist", "feedback", "booking_history", "rating_reviews"]
 
-def post_csv_to_api(file_path, endpoint):
-    with open(file_path, mode='r') as fd:
-        csv_data = csv.DictReader(fd)
-        for row in csv_data:
-            # Convertir campos específicos a listas o diccionarios si es necesario y si no están vacíos
-            if 'preferences' in row and row['preferences'].strip():
-                row['preferences'] = row['preferences'].split(',')
-            if 'activity_log' in row and row['activity_log'].strip():
-                try:
-                    row['activity_log'] = json.loads(row['activity_log'])
-                except json.JSONDecodeError as e:
-                    print(f"JSONDecodeError for activity_log: {e}")
-                    row['activity_log'] = []
-            if 'watchlist' in row and row['watchlist'].strip():
-                try:
-                    row['watchlist'] = json.loads(row['watchlist'])
-                except json.JSONDecodeError as e:
-                    print(f"JSONDecodeError for watchlist: {e}")
-                    row['watchlist'] = []
-            if 'feedback' in row and row['feedback'].strip():
-                try:
-                    row['feedback'] = json.loads(row['feedback'])
-                except json.JSONDecodeError as e:
-                    print(f"JSONDecodeError for feedback: {e}")
-                    row['feedback'] = []
-            if 'booking_history' in row and row['booking_history'].strip():
-                try:
-                    row['booking_history'] = json.loads(row['booking_history'])
-                except json.JSONDecodeError as e:
-                    print(f"JSONDecodeError for booking_history: {e}")
-                    row['booking_history'] = []
-            if 'rating_reviews' in row and row['rating_reviews'].strip():
-                try:
-                    row['rating_reviews'] = json.loads(row['rating_reviews'])
-                except json.JSONDecodeError as e:
-                    print(f"JSONDecodeError for rating_reviews: {e}")
-                    row['rating_reviews'] = []
+def parse_row(row):
+    # Convertir campos específicos a listas o diccionarios si es necesario y si no están vacíos
+    if 'preferences' in row and row['preferences'].strip():
+        row['preferences'] = row['preferences'].split(',')
+    for field in JSON_FIELDS:
+        if field in row and row[field].strip():
+            try:
+                row[field] = json.loads(row[field])
+            except json.JSONDecodeError as e:
+                print(f"JSONDecodeError for {field}: {e}")
+                row[field] = []
 
-            # Manejar campo de fecha desactivado
-            if 'deactivated_at' in row and not row['deactivated_at'].strip():
-                row['deactivated_at'] = None
+    # Manejar campo de fecha desactivado
+    if 'deactivated_at' in row and not row['deactivated_at'].strip():
+        row['deactivated_at'] = None
+    return row
 
-            response = requests.post(f"{BASE_URL}/{endpoint}", json=row)
-            if not response.ok:
-                print(f"Failed to post to {endpoint}: {response.status_code} - {response.text}")
-            else:
-                print(f"Successfully posted to {endpoint}: {row}")
+def read_batches(file_path, batch_size):
+    # Leer el CSV por bloques para no cargar el archivo completo en memoria
+    with open(file_path, mode='r', newline='') as fd:
+        rows = (parse_row(row) for row in csv.DictReader(fd))
+        while batch := list(islice(rows, batch_size)):
+            yield batch
+
+def post_batch(session, endpoint, batch):
+    response = session.post(f"{BASE_URL}/{endpoint}/bulk", json=batch)
+    if not response.ok:
+        print(f"Failed to post to {endpoint}: {response.status_code} - {response.text}")
+        return 0
+    result = response.json()
+    for error in result["errors"]:
+        print(f"Failed row {error['index']} for {endpoint}: {error['error']}")
+    return result["inserted_count"]
+
+def post_csv_to_api(session, executor, file_path, endpoint, batch_size, in_flight):
+    pending = set()
+    inserted = 0
+    for batch in read_batches(file_path, batch_size):
+        if len(pending) >= in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            inserted += sum(future.result() for future in done)
+        pending.add(executor.submit(post_batch, session, endpoint, batch))
+    inserted += sum(future.result() for future in wait(pending).done)
+    print(f"Successfully posted {inserted} rows to {endpoint}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Load the CSV fixtures through the bulk endpoints")
+    parser.add_argument("--movies", default=os.path.join(CSV_DIR, "movies.csv"))
+    parser.add_argument("--showtimes", default=os.path.join(CSV_DIR, "showtime.csv"))
+    parser.add_argument("--theaters", default=os.path.join(CSV_DIR, "theater.csv"))
+    parser.add_argument("--users", default=os.path.join(CSV_DIR, "users.csv"))
+    parser.add_argument("--notifications", default=os.path.join(CSV_DIR, "notifications.csv"))
+    parser.add_argument("-b", "--batch-size", type=int, default=1000,
+                        help="Rows sent per bulk request")
+    parser.add_argument("-w", "--workers", type=int, default=4,
+                        help="Bulk requests kept in flight at once")
+    args = parser.parse_args()
+
     files_endpoints = [
-        (r".\csv\movies.csv", "movie"),
-        (r".\csv\showtime.csv", "showtime"),
-        (r".\csv\theater.csv", "theater"),
-        (r".\csv\users.csv", "user"),
-        (r".\csv\notifications.csv", "notification")
+        (args.movies, "movie"),
+        (args.showtimes, "showtime"),
+        (args.theaters, "theater"),
+        (args.users, "user"),
+        (args.notifications, "notification")
     ]
 
-    for file_path, endpoint in files_endpoints:
-        post_csv_to_api(file_path, endpoint)
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=args.workers) as executor:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=args.workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        for file_path, endpoint in files_endpoints:
+            post_csv_to_api(session, executor, file_path, endpoint, args.batch_size, args.workers)
 
 if __name__ == "__main__":
     main()
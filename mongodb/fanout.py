@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+from pymongo import AsyncMongoClient
+from pymongo.errors import BulkWriteError
+
+FANOUT_BATCH_SIZE = int(os.getenv('NOTIFICATION_FANOUT_BATCH_SIZE', '1000'))
+DUPLICATE_KEY = 11000
+
+# Fan-out de notificaciones al anunciar un Showtime: una notificacion por cada
+# usuario con la pelicula en su watchlist (por id o por titulo), insertadas en
+# lotes con insert_many. El _id es "<showtime_id>:<user_id>", asi que repetir
+# el fan-out no duplica notificaciones.
+
+async def insert_batch(db, docs):
+    try:
+        result = await db["notifications"].insert_many(docs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+            raise
+        return e.details["nInserted"]
+
+async def fan_out_showtime(db, showtime_id, batch_size=FANOUT_BATCH_SIZE):
+    showtime = await db["showtimes"].find_one({"_id": showtime_id}, {"movie_id": 1, "showtime": 1})
+    if showtime is None:
+        return None
+    movie = await db["movies"].find_one({"_id": showtime["movie_id"]}, {"title": 1})
+    keys = [showtime["movie_id"]] + ([movie["title"]] if movie and movie.get("title") else [])
+    inserted = 0
+    batch = []
+    async for user in db["users"].find({"watchlist": {"$in": keys}}, {"_id": 1}, batch_size=batch_size):
+        batch.append({
+            "_id": f"{showtime_id}:{user['_id']}",
+            "user_id": user["_id"],
+            "movie_id": showtime["movie_id"],
+            "showtime": showtime["showtime"],
+            "status": "unread",
+            "version": 1,
+        })
+        if len(batch) == batch_size:
+            inserted += await insert_batch(db, batch)
+            batch = []
+    if batch:
+        inserted += await insert_batch(db, batch)
+    return inserted
+
+async def main(showtime_ids):
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        db = client[os.getenv('MONGODB_DB_NAME', 'pro')]
+        for showtime_id in showtime_ids:
+            inserted = await fan_out_showtime(db, showtime_id)
+            if inserted is None:
+                print(f"Showtime with ID {showtime_id} not found")
+            else:
+                print(f"Created {inserted} notifications for showtime {showtime_id}")
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,231 @@
+import base64
+import json
+import os
+from datetime import datetime
+from enum import Enum
+from itertools import groupby
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne, UpdateOne
+from model import utc_now
+
+RECENT_ENTRIES = int(os.getenv('USER_HISTORY_RECENT', '20'))
+BUCKET_SIZE = int(os.getenv('USER_HISTORY_BUCKET_SIZE', '200'))
+
+# Historiales de User fuera del documento: cada campo vive en su propia
+# coleccion, en buckets de hasta BUCKET_SIZE entradas por usuario y mes.
+#   {_id, user_id, period: "YYYY-MM", count, entries: [...]}
+# El documento del usuario solo guarda las RECENT_ENTRIES mas recientes
+# de cada campo y el total en history_counts.
+HISTORY = {
+    "activity_log": ("user_activity", "timestamp"),
+    "feedback": ("user_feedback", "timestamp"),
+    "booking_history": ("user_bookings", "booking_date"),
+    "rating_reviews": ("user_reviews", "timestamp"),
+}
+HISTORY_PROJECTION = {field: 1 for field in HISTORY}
+# Usuarios con los historiales ya en buckets
+MIGRATED = {"history_counts": {"$exists": True}}
+HISTORY_INDEXES = {
+    collection: [IndexModel([("user_id", ASCENDING), ("period", DESCENDING), ("_id", DESCENDING)])]
+    for collection, _ in HISTORY.values()
+}
+
+class HistoryKind(str, Enum):
+    activity = "activity"
+    feedback = "feedback"
+    bookings = "bookings"
+    reviews = "reviews"
+
+HISTORY_FIELDS = {
+    HistoryKind.activity: "activity_log",
+    HistoryKind.feedback: "feedback",
+    HistoryKind.bookings: "booking_history",
+    HistoryKind.reviews: "rating_reviews",
+}
+
+def period_of(entry, time_field):
+    value = entry.get(time_field)
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m")
+    if isinstance(value, str) and len(value) >= 7 and value[4] == "-":
+        return value[:7]
+    return utc_now().strftime("%Y-%m")
+
+def by_period(entries, time_field):
+    keyed = sorted(((period_of(entry, time_field), entry) for entry in entries), key=lambda pair: pair[0])
+    for period, group in groupby(keyed, key=lambda pair: pair[0]):
+        yield period, [entry for _, entry in group]
+
+def bucket_updates(user_id, field, entries, open_counts):
+    # Trozos de hasta BUCKET_SIZE por mes; el primero solo ocupa lo que le queda
+    # al bucket abierto (open_counts: periodo -> count). El filtro exige sitio para
+    # el trozo entero, asi que si otra escritura lo lleno se crea un bucket nuevo.
+    # Devuelve pares (trozo, operacion)
+    _, time_field = HISTORY[field]
+    operations = []
+    for period, group in by_period(entries, time_field):
+        start, room = 0, BUCKET_SIZE - open_counts.get(period, 0)
+        while start < len(group):
+            chunk = group[start:start + room]
+            operations.append((chunk, UpdateOne(
+                {"user_id": user_id, "period": period, "count": {"$lte": BUCKET_SIZE - len(chunk)}, "sealed": {"$exists": False}},
+                {
+                    "$push": {"entries": {"$each": chunk}},
+                    "$inc": {"count": len(chunk)},
+                    "$setOnInsert": {"_id": f"{user_id}:{period}:{ObjectId()}"},
+                },
+                upsert=True,
+            )))
+            start, room = start + len(chunk), BUCKET_SIZE
+    return operations
+
+def summary_update(histories):
+    update = {"$push": {}, "$inc": {"version": 1}}
+    for field, entries in histories.items():
+        update["$push"][field] = {"$each": entries, "$slice": -RECENT_ENTRIES}
+        update["$inc"][f"history_counts.{field}"] = len(entries)
+    return update
+
+def split_user(doc):
+    # Dejar en el documento solo el resumen acotado de cada historial
+    doc = dict(doc)
+    doc["history_counts"] = {}
+    for field in HISTORY:
+        entries = doc.get(field) or []
+        doc[field] = entries[-RECENT_ENTRIES:]
+        doc["history_counts"][field] = len(entries)
+    return doc
+
+async def open_bucket_counts(collection, pending):
+    # Una lectura por coleccion: count del bucket abierto de cada usuario y mes
+    users = list({user_id for user_id, _, _ in pending})
+    periods = list({period for _, field, entries in pending for period, _ in by_period(entries, HISTORY[field][1])})
+    counts = {}
+    cursor = collection.find(
+        {"user_id": {"$in": users}, "period": {"$in": periods}, "count": {"$lt": BUCKET_SIZE}, "sealed": {"$exists": False}},
+        {"user_id": 1, "period": 1, "count": 1},
+    )
+    async for bucket in cursor:
+        user_counts = counts.setdefault(bucket["user_id"], {})
+        user_counts[bucket["period"]] = min(bucket["count"], user_counts.get(bucket["period"], BUCKET_SIZE))
+    return counts
+
+async def bucket_writes(db, histories_by_user):
+    # Por coleccion, las operaciones y en el mismo orden lo que escribe cada una
+    # como (user_id, {field: trozo}), para poder reintentar solo las que fallen
+    pending = {}
+    for user_id, histories in histories_by_user:
+        for field, entries in histories.items():
+            if entries:
+                pending.setdefault(HISTORY[field][0], []).append((user_id, field, entries))
+    writes = {}
+    for collection, items in pending.items():
+        counts = await open_bucket_counts(db[collection], items)
+        ops, chunks = [], []
+        for user_id, field, entries in items:
+            for chunk, op in bucket_updates(user_id, field, entries, counts.get(user_id, {})):
+                ops.append(op)
+                chunks.append((user_id, {field: chunk}))
+        writes[collection] = (ops, chunks)
+    return writes
+
+async def write_buckets(db, histories_by_user):
+    for collection, (ops, _) in (await bucket_writes(db, histories_by_user)).items():
+        await db[collection].bulk_write(ops, ordered=False)
+
+async def write_user_histories(db, docs):
+    await write_buckets(db, [(doc["_id"], {field: doc.get(field) or [] for field in HISTORY}) for doc in docs])
+
+async def append(db, user_id, histories):
+    # Solo sobre usuarios migrados: en uno antiguo el $slice del resumen recortaria
+    # los historiales embebidos antes de pasarlos a buckets, asi que se migra primero
+    for attempt in range(2):
+        result = await db["users"].update_one({"_id": user_id, **MIGRATED}, summary_update(histories))
+        if result.matched_count:
+            await write_buckets(db, [(user_id, histories)])
+            return True
+        if attempt == 0:
+            await migrate_legacy(db, [user_id])
+    return False
+
+async def delete_user_histories(db, user_id):
+    for collection, _ in HISTORY.values():
+        await db[collection].delete_many({"user_id": user_id})
+
+def sealed_buckets(user_id, field, entries):
+    # Buckets de la migracion con _id determinista para poder repetirla sin duplicar
+    _, time_field = HISTORY[field]
+    for period, group in by_period(entries, time_field):
+        for chunk, start in enumerate(range(0, len(group), BUCKET_SIZE)):
+            bucket_id = f"{user_id}:{period}:0-{chunk:06d}"
+            entries_chunk = group[start:start + BUCKET_SIZE]
+            yield ReplaceOne(
+                {"_id": bucket_id},
+                {"_id": bucket_id, "user_id": user_id, "period": period, "count": len(entries_chunk), "entries": entries_chunk, "sealed": True},
+                upsert=True,
+            )
+
+async def migrate_batch(db, batch):
+    operations = {}
+    user_updates = []
+    for doc in batch:
+        for field in HISTORY:
+            operations.setdefault(HISTORY[field][0], []).extend(sealed_buckets(doc["_id"], field, doc.get(field) or []))
+        summary = split_user({field: doc.get(field) for field in HISTORY})
+        user_updates.append(UpdateOne({"_id": doc["_id"], "history_counts": {"$exists": False}}, {"$set": summary, "$inc": {"version": 1}}))
+    for collection, ops in operations.items():
+        if ops:
+            await db[collection].bulk_write(ops, ordered=False)
+    await db["users"].bulk_write(user_updates, ordered=False)
+
+async def migrate_users(db, batch_size=500):
+    # Convierte por lotes los usuarios que todavia tienen los historiales embebidos
+    migrated = 0
+    while True:
+        batch = await db["users"].find({"history_counts": {"$exists": False}}, HISTORY_PROJECTION).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return migrated
+        await migrate_batch(db, batch)
+        migrated += len(batch)
+        print(f"Migrated {migrated} users")
+
+async def migrate_legacy(db, user_ids):
+    # Migracion en linea de los usuarios antiguos de la lista antes de escribirles historial
+    batch = await db["users"].find({"_id": {"$in": user_ids}, "history_counts": {"$exists": False}}, HISTORY_PROJECTION).to_list(length=None)
+    if batch:
+        await migrate_batch(db, batch)
+    return len(batch)
+
+def encode_cursor(period, bucket_id, position):
+    return base64.urlsafe_b64encode(json.dumps([period, bucket_id, position]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        period, bucket_id, position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor {cursor}")
+    return period, bucket_id, position
+
+async def list_entries(db, user_id, field, limit, after=None):
+    # Entradas de la mas reciente a la mas antigua; el cursor guarda una posicion
+    # absoluta dentro del bucket, que no cambia al agregar entradas nuevas
+    collection, _ = HISTORY[field]
+    query = {"user_id": user_id}
+    start_bucket, start_position = None, None
+    if after:
+        period, start_bucket, start_position = decode_cursor(after)
+        query["$or"] = [{"period": {"$lt": period}}, {"period": period, "_id": {"$lte": start_bucket}}]
+    entries, next_cursor = [], None
+    cursor = db[collection].find(query, {"period": 1, "entries": 1}).sort([("period", DESCENDING), ("_id", DESCENDING)])
+    try:
+        async for bucket in cursor:
+            end = start_position if bucket["_id"] == start_bucket else len(bucket["entries"])
+            begin = max(0, end - (limit - len(entries)))
+            entries.extend(reversed(bucket["entries"][begin:end]))
+            if len(entries) >= limit:
+                next_cursor = encode_cursor(bucket["period"], bucket["_id"], begin)
+                break
+    finally:
+        await cursor.close()
+    return entries, next_cursor
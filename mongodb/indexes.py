@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+from pymongo import AsyncMongoClient
+from pymongo.errors import OperationFailure
+from model import User, Movie, Showtime, Theater, Notification
+from history import HISTORY_INDEXES
+import archive
+import ratings
+import seats
+
+# Indices declarados en cada modelo mas los de colecciones auxiliares
+INDEXES = {model.collection: model.indexes for model in [User, Movie, Showtime, Theater, Notification]}
+INDEXES.update({archive.ARCHIVES[model.collection]: model.indexes for model in [Showtime, Notification]})
+INDEXES[seats.SEAT_MAPS] = seats.SEAT_MAP_INDEXES
+INDEXES[ratings.MOVIE_STATS] = ratings.MOVIE_STATS_INDEXES
+INDEXES.update(HISTORY_INDEXES)
+
+async def ensure_indexes(db):
+    # create_indexes es idempotente: los indices existentes con la misma definicion no se tocan.
+    # Si una coleccion falla (p. ej. emails repetidos para el indice unico) se sigue con
+    # las demas y se devuelven las que fallaron
+    failed = []
+    for collection, indexes in INDEXES.items():
+        if indexes:
+            try:
+                names = await db[collection].create_indexes(indexes)
+            except OperationFailure as e:
+                print(f"Failed to create indexes on {collection}: {e}")
+                failed.append(collection)
+                continue
+            print(f"Indexes on {collection}: {', '.join(names)}")
+    return failed
+
+async def main():
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        failed = await ensure_indexes(client[os.getenv('MONGODB_DB_NAME', 'pro')])
+    finally:
+        await client.close()
+    if failed:
+        sys.exit(f"Indexes not created on {', '.join(failed)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
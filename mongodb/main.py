@@ -1,29 +1,95 @@
 #!/usr/bin/env python3
+import asyncio
 import os
-from fastapi import FastAPI
-from pymongo import MongoClient
-from routes import user_router, movie_router, showtime_router, theater_router, notification_router
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from pymongo import AsyncMongoClient
+from routes import user_router, movie_router, showtime_router, theater_router, notification_router, schedule_router
+from buffer import ActivityBuffer
+from cache import build_cache
+from indexes import ensure_indexes
+import archive
+import metrics
+import seats
 
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
 DB_NAME = os.getenv('MONGODB_DB_NAME', 'pro')
+MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '30000'))
+CREATE_INDEXES = os.getenv('MONGODB_CREATE_INDEXES', 'true').lower() == 'true'
+SEAT_HOLD_RECLAIM_INTERVAL = float(os.getenv('SEAT_HOLD_RECLAIM_INTERVAL', '30'))
+ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', 'true').lower() == 'true'
 
 app = FastAPI()
 
+async def reclaim_seat_holds():
+    while True:
+        await asyncio.sleep(SEAT_HOLD_RECLAIM_INTERVAL)
+        try:
+            await seats.reclaim_expired_holds(app.database)
+        except Exception as e:
+            print(f"Failed to reclaim expired seat holds: {e}")
+
 @app.on_event("startup")
-def startup_db_client():
-    app.mongodb_client = MongoClient(MONGODB_URI)
+async def startup_db_client():
+    app.mongodb_client = AsyncMongoClient(
+        MONGODB_URI,
+        maxPoolSize=MAX_POOL_SIZE,
+        minPoolSize=MIN_POOL_SIZE,
+        waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+        serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[metrics.CommandMetrics()],
+    )
     app.database = app.mongodb_client[DB_NAME]
-    print(f"Connected to MongoDB at: {MONGODB_URI} \n\t Database: {DB_NAME}")
+    app.cache = build_cache()
+    # Un indice que no se puede crear no impide arrancar: se avisa y se reintenta con indexes.py
+    if CREATE_INDEXES:
+        await ensure_indexes(app.database)
+    app.reclaim_task = asyncio.create_task(reclaim_seat_holds())
+    app.archive_task = asyncio.create_task(archive.run(app.database)) if ARCHIVE_ENABLED else None
+    app.activity_buffer = ActivityBuffer(app.database)
+    app.activity_buffer.start()
+    print(f"Connected to MongoDB at: {MONGODB_URI} \n\t Database: {DB_NAME} \n\t Pool size: {MIN_POOL_SIZE}-{MAX_POOL_SIZE}")
 
 @app.on_event("shutdown")
-def shutdown_db_client():
-    app.mongodb_client.close()
+async def shutdown_db_client():
+    app.reclaim_task.cancel()
+    if app.archive_task is not None:
+        app.archive_task.cancel()
+    await app.activity_buffer.close()
+    await app.mongodb_client.close()
     print("Bye bye...!!")
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    token = metrics.current_scope.set(request.scope)
+    request_id = metrics.registry.request_started(request.scope)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.registry.request_finished(request_id, status_code, time.perf_counter() - start)
+        metrics.current_scope.reset(token)
+
+@app.get("/metrics", tags=["metrics"], response_description="Request and MongoDB command metrics in Prometheus text format", response_class=PlainTextResponse)
+def read_metrics():
+    return metrics.registry.render()
+
+@app.get("/cache/stats", tags=["cache"], response_description="Hit, miss and eviction counters of the read cache")
+def cache_stats():
+    return app.cache.stats()
+
 app.include_router(user_router, tags=["users"], prefix="/user")
 app.include_router(movie_router, tags=["movies"], prefix="/movie")
 app.include_router(showtime_router, tags=["showtimes"], prefix="/showtime")
 app.include_router(theater_router, tags=["theaters"], prefix="/theater")
 app.include_router(notification_router, tags=["notifications"], prefix="/notification")
+app.include_router(schedule_router, tags=["schedule"], prefix="/schedule")
 
 
@@ -0,0 +1,155 @@
+import os
+import threading
+from contextvars import ContextVar
+from pymongo import monitoring
+
+SLOW_QUERY_MS = float(os.getenv('MONGODB_SLOW_QUERY_MS', '100'))
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Scope ASGI del request en curso. El router guarda ahi la ruta elegida antes de
+# llamar al endpoint, y AsyncMongoClient emite los eventos dentro de la misma
+# tarea, asi que el CommandListener puede nombrar la ruta de cada comando.
+current_scope = ContextVar("current_scope", default=None)
+
+def route_of(scope):
+    # Plantilla completa de la ruta (p. ej. "/user/{id}") para no crear una serie
+    # por cada id. Segun la version de FastAPI, route.path puede venir sin el
+    # prefijo del router, asi que el prefijo se toma de los segmentos del path
+    # real que quedan antes de la plantilla.
+    route = scope.get("route") if scope else None
+    if route is None or not hasattr(route, "path"):
+        return "unmatched"
+    parts = scope["path"].split("/")
+    return "/".join(parts[:max(0, len(parts) - route.path.count("/"))]) + route.path
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+# Registro en memoria, expuesto en formato de texto de Prometheus por /metrics.
+# El lock cubre a los clientes sincronos, que registran comandos desde otros hilos.
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.in_flight = {}
+        self.next_request = 0
+        self.commands = {}
+        self.documents = {}
+        self.failures = {}
+
+    def request_started(self, scope):
+        with self.lock:
+            self.next_request += 1
+            self.in_flight[self.next_request] = scope
+            return self.next_request
+
+    def request_finished(self, request_id, status, seconds):
+        with self.lock:
+            scope = self.in_flight.pop(request_id)
+            self.requests.setdefault((scope["method"], route_of(scope), str(status)), Histogram()).observe(seconds)
+
+    def command_succeeded(self, collection, command, seconds, documents):
+        with self.lock:
+            self.commands.setdefault((collection, command), Histogram()).observe(seconds)
+            self.documents[(collection, command)] = self.documents.get((collection, command), 0) + documents
+
+    def command_failed(self, collection, command, seconds):
+        with self.lock:
+            self.commands.setdefault((collection, command), Histogram()).observe(seconds)
+            self.failures[(collection, command)] = self.failures.get((collection, command), 0) + 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            render_histograms(lines, "http_request_duration_seconds", "Request latency by route", ("method", "route", "status"), self.requests)
+            # La ruta de los requests en curso se resuelve al leer las metricas
+            in_flight = {}
+            for scope in self.in_flight.values():
+                key = (scope["method"], route_of(scope))
+                in_flight[key] = in_flight.get(key, 0) + 1
+            render_values(lines, "http_requests_in_flight", "gauge", "Requests being served by route", ("method", "route"), in_flight)
+            render_histograms(lines, "mongodb_command_duration_seconds", "MongoDB command latency", ("collection", "command"), self.commands)
+            render_values(lines, "mongodb_command_documents_total", "counter", "Documents returned or written by MongoDB commands", ("collection", "command"), self.documents)
+            render_values(lines, "mongodb_command_failures_total", "counter", "Failed MongoDB commands", ("collection", "command"), self.failures)
+        return "\n".join(lines) + "\n"
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+def render_histograms(lines, name, help, names, histograms):
+    lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{labels(names, key, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{labels(names, key, [('le', '+Inf')])} {histogram.count}")
+        lines.append(f"{name}_sum{labels(names, key)} {histogram.sum}")
+        lines.append(f"{name}_count{labels(names, key)} {histogram.count}")
+
+def render_values(lines, name, kind, help, names, values):
+    lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{labels(names, key)} {value}")
+
+registry = Metrics()
+
+def collection_of(event):
+    target = event.command.get(event.command_name)
+    if event.command_name == "getMore":
+        return event.command.get("collection", "-")
+    return target if isinstance(target, str) else "-"
+
+def documents_of(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "value" in reply:
+        return 1 if reply["value"] is not None else 0
+    n = reply.get("n", 0)
+    return n if isinstance(n, int) else 0
+
+class CommandMetrics(monitoring.CommandListener):
+    def __init__(self, registry=registry, slow_query_ms=SLOW_QUERY_MS):
+        self.registry = registry
+        self.slow_query_ms = slow_query_ms
+        self.started_commands = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        with self.lock:
+            scope = current_scope.get()
+            route = f"{scope['method']} {route_of(scope)}" if scope else "-"
+            self.started_commands[(event.connection_id, event.request_id)] = (collection_of(event), route)
+
+    def finished(self, event):
+        with self.lock:
+            collection, route = self.started_commands.pop((event.connection_id, event.request_id), ("-", "-"))
+        elapsed_ms = event.duration_micros / 1000
+        if elapsed_ms >= self.slow_query_ms:
+            print(f"Slow query: {event.command_name} on {collection} took {elapsed_ms:.1f} ms (route {route})")
+        return collection, elapsed_ms / 1000
+
+    def succeeded(self, event):
+        collection, seconds = self.finished(event)
+        self.registry.command_succeeded(collection, event.command_name, seconds, documents_of(event.reply))
+
+    def failed(self, event):
+        collection, seconds = self.finished(event)
+        self.registry.command_failed(collection, event.command_name, seconds)
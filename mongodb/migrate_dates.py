@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from pymongo import AsyncMongoClient, UpdateOne
+from model import naive_utc
+import archive
+
+# Fechas guardadas antes de normalizar a UTC sin offset ("...Z", "...+02:00"):
+# se reescriben en la forma que ahora escribe el API para que las comparaciones
+# de texto (filtros por fecha, cursores, archivado) vuelvan a ser cronologicas.
+DATE_FIELDS = {
+    "users": ["created_at", "last_login", "deactivated_at"],
+    "showtimes": ["showtime"],
+    "notifications": ["showtime", "read_at"],
+}
+DATE_FIELDS.update({archive.ARCHIVES[collection]: fields for collection, fields in list(DATE_FIELDS.items()) if collection in archive.ARCHIVES})
+WITH_OFFSET = r"(Z|[+-]\d\d:?\d\d)$"
+
+async def normalize_field(db, collection, field, batch_size):
+    updated = 0
+    while True:
+        docs = await db[collection].find({field: {"$regex": WITH_OFFSET}}, {field: 1}).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            return updated
+        # El filtro incluye el valor leido para no pisar una escritura concurrente
+        operations = [
+            UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: naive_utc(datetime.fromisoformat(doc[field].replace("Z", "+00:00"))).isoformat()}})
+            for doc in docs
+        ]
+        result = await db[collection].bulk_write(operations, ordered=False)
+        updated += result.modified_count
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rewrite stored dates with a UTC offset as naive UTC ISO 8601")
+    parser.add_argument("-b", "--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        db = client[os.getenv('MONGODB_DB_NAME', 'pro')]
+        for collection, fields in DATE_FIELDS.items():
+            for field in fields:
+                updated = await normalize_field(db, collection, field, args.batch_size)
+                print(f"Normalized {updated} {collection}.{field}")
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+from pymongo import AsyncMongoClient
+from history import migrate_users
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move embedded user histories into their bucket collections")
+    parser.add_argument("-b", "--batch-size", type=int, default=500,
+                        help="Users converted per batch")
+    args = parser.parse_args()
+
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        migrated = await migrate_users(client[os.getenv('MONGODB_DB_NAME', 'pro')], args.batch_size)
+        print(f"Done, {migrated} users migrated")
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,20 @@
 import uuid
-from typing import Optional, List
-from pydantic import BaseModel, Field
-from datetime import datetime
+from typing import Annotated, ClassVar, Dict, Optional, List
+from pydantic import AfterValidator, BaseModel, Field
+from pymongo import ASCENDING, IndexModel
+from datetime import datetime, timezone
+
+# Las fechas se guardan como texto ISO 8601 en UTC y sin offset: solo asi el
+# orden del texto es el cronologico en filtros, cursores y archivado
+def naive_utc(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+UTCDateTime = Annotated[datetime, AfterValidator(naive_utc)]
 
 # Modelo para User
 class User(BaseModel):
@@ -9,16 +22,26 @@ class User(BaseModel):
     username: str = Field(...)
     email: str = Field(...)
     hashed_password: str = Field(...)
-    created_at: datetime = Field(...)
-    last_login: Optional[datetime] = Field(None)
+    created_at: UTCDateTime = Field(...)
+    last_login: Optional[UTCDateTime] = Field(None)
     preferences: List[str] = Field(default_factory=list)
     activity_log: List[dict] = Field(default_factory=list)
     watchlist: List[str] = Field(default_factory=list)
-    deactivated_at: Optional[datetime] = Field(None)
+    deactivated_at: Optional[UTCDateTime] = Field(None)
     tier: Optional[str] = Field(None)
     feedback: List[dict] = Field(default_factory=list)
     booking_history: List[dict] = Field(default_factory=list)
     rating_reviews: List[dict] = Field(default_factory=list)
+    # activity_log, feedback, booking_history y rating_reviews solo guardan las
+    # entradas mas recientes; el historial completo esta en /user/{id}/<kind>
+    history_counts: dict = Field(default_factory=dict)
+
+    collection: ClassVar[str] = "users"
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)]),
+        IndexModel([("watchlist", ASCENDING)]),
+    ]
 
     class Config:
         populate_by_name = True
@@ -37,7 +60,8 @@ class User(BaseModel):
                 "tier": "gold",
                 "feedback": [{"feedback_text": "Great service!", "rating": 5, "timestamp": "2024-11-20T15:35:00Z"}],
                 "booking_history": [{"movie_id": "f54a9f9c-bac9-43f4-a0fa-fffd0dc9270c", "showtime_id": "e54a9f9c-bac9-43f4-a0fa-fffd0dc9270c", "theater_id": "5fb789c1def0e105d7cbbc20", "booking_date": "2024-11-19T18:00:00Z"}],
-                "rating_reviews": [{"movie_id": "f54a9f9c-bac9-43f4-a0fa-fffd0dc9270c", "rating": 5, "review_text": "Amazing movie!", "timestamp": "2024-11-20T18:00:00Z"}]
+                "rating_reviews": [{"movie_id": "f54a9f9c-bac9-43f4-a0fa-fffd0dc9270c", "rating": 5, "review_text": "Amazing movie!", "timestamp": "2024-11-20T18:00:00Z"}],
+                "history_counts": {"activity_log": 1, "feedback": 1, "booking_history": 1, "rating_reviews": 1}
             }
         }
 
@@ -49,6 +73,11 @@ class Movie(BaseModel):
     duration: int = Field(...)
     description: str = Field(...)
 
+    collection: ClassVar[str] = "movies"
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("genre", ASCENDING), ("_id", ASCENDING)]),
+    ]
+
     class Config:
         populate_by_name = True
         json_schema_extra = {
@@ -61,14 +90,44 @@ class Movie(BaseModel):
             }
         }
 
+# Calificaciones agregadas de una Movie, precalculadas en movie_stats
+class MovieStats(BaseModel):
+    id: str = Field(..., alias="_id")
+    count: int = Field(0)
+    sum: float = Field(0)
+    mean: Optional[float] = Field(None)
+    histogram: Dict[str, int] = Field(default_factory=dict)
+
+    class Config:
+        populate_by_name = True
+
+# Recomendaciones precalculadas de un User, ids de Movie del mejor al peor puntaje
+class Recommendations(BaseModel):
+    id: str = Field(..., alias="_id")
+    movies: List[str] = Field(default_factory=list)
+    scores: List[float] = Field(default_factory=list)
+    catalog_version: int = Field(...)
+    user_version: int = Field(...)
+    computed_at: UTCDateTime = Field(...)
+
+    class Config:
+        populate_by_name = True
+
 # Modelo para Showtime
 class Showtime(BaseModel):
     id: str = Field(default_factory=uuid.uuid4, alias="_id")
     movie_id: str = Field(...)
     theater_id: str = Field(...)
-    showtime: datetime = Field(...)
+    showtime: UTCDateTime = Field(...)
     available_seats: int = Field(...)
 
+    collection: ClassVar[str] = "showtimes"
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("movie_id", ASCENDING), ("showtime", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("theater_id", ASCENDING), ("showtime", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("showtime", ASCENDING), ("_id", ASCENDING)]),
+    ]
+
     class Config:
         populate_by_name = True
         json_schema_extra = {
@@ -81,6 +140,47 @@ class Showtime(BaseModel):
             }
         }
 
+# Modelo para reservar asientos de un Showtime
+class Booking(BaseModel):
+    user_id: str = Field(...)
+    quantity: int = Field(..., gt=0)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "user_id": "5e12b4c9a7896d5c2f34bc72",
+                "quantity": 2
+            }
+        }
+
+# Modelos para el mapa de asientos de un Showtime
+class SeatHoldRequest(BaseModel):
+    seats: List[int] = Field(..., min_length=1)
+    ttl_seconds: int = Field(300, gt=0, le=3600)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "seats": [10, 11],
+                "ttl_seconds": 300
+            }
+        }
+
+class SeatHold(BaseModel):
+    hold_id: str = Field(...)
+    seats: List[int] = Field(...)
+    expires_at: UTCDateTime = Field(...)
+
+class SeatMap(BaseModel):
+    id: str = Field(..., alias="_id")
+    capacity: int = Field(...)
+    sold: str = Field(..., description="Base64 bitmap, bit i set when seat i is sold")
+    held: str = Field(..., description="Base64 bitmap, bit i set when seat i is held")
+    available_count: int = Field(...)
+
+    class Config:
+        populate_by_name = True
+
 # Modelo para Theater
 class Theater(BaseModel):
     id: str = Field(default_factory=uuid.uuid4, alias="_id")
@@ -88,6 +188,11 @@ class Theater(BaseModel):
     location: str = Field(...)
     seating_capacity: int = Field(...)
 
+    collection: ClassVar[str] = "theaters"
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("location", ASCENDING)]),
+    ]
+
     class Config:
         populate_by_name = True
         json_schema_extra = {
@@ -99,13 +204,25 @@ class Theater(BaseModel):
             }
         }
 
+# Showtime con su Movie y su Theater, resultado del $lookup de /schedule
+class ScheduleEntry(Showtime):
+    movie: Optional[Movie] = Field(None)
+    theater: Optional[Theater] = Field(None)
+
 # Modelo para Notification
 class Notification(BaseModel):
     id: str = Field(default_factory=uuid.uuid4, alias="_id")
     user_id: str = Field(...)
     movie_id: Optional[str]
-    showtime: Optional[datetime]
+    showtime: Optional[UTCDateTime]
     status: str = Field(...)
+    read_at: Optional[UTCDateTime] = Field(None)
+
+    collection: ClassVar[str] = "notifications"
+    indexes: ClassVar[List[IndexModel]] = [
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("read_at", ASCENDING)]),
+    ]
 
     class Config:
         populate_by_name = True
@@ -118,3 +235,16 @@ class Notification(BaseModel):
                 "status": "unread"
             }
         }
+
+class MarkRead(BaseModel):
+    user_id: str = Field(...)
+    ids: Optional[List[str]] = Field(None, description="Only these notifications; all unread ones when omitted")
+
+# Resultado de las inserciones masivas
+class BulkError(BaseModel):
+    index: int = Field(...)
+    error: str = Field(...)
+
+class BulkResult(BaseModel):
+    inserted_count: int = Field(...)
+    errors: List[BulkError] = Field(default_factory=list)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+from enum import Enum
+from pymongo import ASCENDING, AsyncMongoClient, DESCENDING, IndexModel, UpdateOne
+from history import HISTORY
+from repository import encode_cursor, decode_cursor
+
+MOVIE_STATS = "movie_stats"
+MOVIE_STATS_INDEXES = [IndexModel([("mean", DESCENDING), ("_id", ASCENDING)])]
+REVIEWS_COLLECTION, _ = HISTORY["rating_reviews"]
+
+# Estadisticas de calificacion por Movie, materializadas a partir de rating_reviews.
+#   {_id: movie_id, count, sum, mean, histogram: {"1": n, ..., "5": n}}
+# Cada review escrita suma su calificacion con un update incremental;
+# rebuild() las recalcula desde cero con $merge a partir de los buckets.
+
+class MovieSort(str, Enum):
+    id = "id"
+    rating = "rating"
+
+def valid_reviews(reviews):
+    for review in reviews:
+        rating = review.get("rating")
+        if isinstance(review.get("movie_id"), str) and isinstance(rating, (int, float)) and not isinstance(rating, bool):
+            yield review["movie_id"], rating
+
+def stats_updates(reviews, sign=1):
+    totals = {}
+    for movie_id, rating in valid_reviews(reviews):
+        count, total, histogram = totals.get(movie_id, (0, 0, {}))
+        bucket = str(int(round(rating)))
+        histogram[bucket] = histogram.get(bucket, 0) + sign
+        totals[movie_id] = (count + sign, total + sign * rating, histogram)
+    # Update con pipeline para recalcular la media en la misma escritura. Al restar
+    # no se hace upsert: sin stats (p. ej. pelicula borrada) no hay nada que descontar
+    return [
+        UpdateOne(
+            {"_id": movie_id},
+            [
+                {"$set": {
+                    "count": {"$add": [{"$ifNull": ["$count", 0]}, count]},
+                    "sum": {"$add": [{"$ifNull": ["$sum", 0]}, total]},
+                    **{f"histogram.{bucket}": {"$add": [{"$ifNull": [f"$histogram.{bucket}", 0]}, n]} for bucket, n in histogram.items()},
+                }},
+                {"$set": {"mean": {"$cond": [{"$gt": ["$count", 0]}, {"$divide": ["$sum", "$count"]}, None]}}},
+            ],
+            upsert=sign > 0,
+        )
+        for movie_id, (count, total, histogram) in totals.items()
+    ]
+
+async def record_reviews(db, reviews, sign=1):
+    if updates := stats_updates(reviews, sign):
+        await db[MOVIE_STATS].bulk_write(updates, ordered=False)
+
+async def record_user_reviews(db, docs):
+    await record_reviews(db, [review for doc in docs for review in doc.get("rating_reviews") or []])
+
+async def forget_user_reviews(db, user_id):
+    # Restar las reviews de un usuario antes de borrar sus buckets
+    reviews = []
+    async for bucket in db[REVIEWS_COLLECTION].find({"user_id": user_id}, {"entries": 1}):
+        reviews.extend(bucket["entries"])
+    await record_reviews(db, reviews, sign=-1)
+
+async def find_stats(db, movie_id):
+    return await db[MOVIE_STATS].find_one({"_id": movie_id})
+
+async def list_by_rating(db, limit, after=None, genre=None, ids=None):
+    # Peliculas con calificaciones, de la mejor a la peor, paginadas por (mean, _id)
+    query = {"count": {"$gt": 0}}
+    if ids:
+        query["_id"] = {"$in": ids}
+    if after:
+        mean, last_id = decode_cursor(after)
+        query["$or"] = [{"mean": {"$lt": mean}}, {"mean": mean, "_id": {"$gt": last_id}}]
+    pipeline = [
+        {"$match": query},
+        {"$sort": {"mean": -1, "_id": 1}},
+        {"$lookup": {"from": "movies", "localField": "_id", "foreignField": "_id", "as": "movie"}},
+        {"$unwind": "$movie"},
+    ]
+    if genre:
+        pipeline.append({"$match": {"movie.genre": genre}})
+    pipeline += [{"$limit": limit + 1}, {"$project": {"mean": 1, "movie": 1}}]
+    rows = await (await db[MOVIE_STATS].aggregate(pipeline)).to_list(length=limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], "mean")
+    return [row["movie"] for row in rows], next_cursor
+
+async def rebuild(db):
+    # Recalculo completo desde los buckets de reviews; los usuarios con historiales
+    # embebidos deben migrarse antes con migrate_history.py
+    cursor = await db[REVIEWS_COLLECTION].aggregate([
+        {"$unwind": "$entries"},
+        {"$match": {"entries.movie_id": {"$type": "string"}, "entries.rating": {"$type": "number"}}},
+        {"$group": {
+            "_id": {"movie_id": "$entries.movie_id", "rating": {"$toString": {"$toInt": {"$round": ["$entries.rating", 0]}}}},
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$entries.rating"},
+        }},
+        {"$group": {
+            "_id": "$_id.movie_id",
+            "count": {"$sum": "$count"},
+            "sum": {"$sum": "$sum"},
+            "histogram": {"$push": {"k": "$_id.rating", "v": "$count"}},
+        }},
+        {"$project": {"count": 1, "sum": 1, "mean": {"$divide": ["$sum", "$count"]}, "histogram": {"$arrayToObject": "$histogram"}}},
+        {"$merge": {"into": MOVIE_STATS, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ])
+    await cursor.to_list(length=None)
+    # Peliculas que ya no tienen ninguna review
+    reviewed = await db[REVIEWS_COLLECTION].distinct("entries.movie_id")
+    result = await db[MOVIE_STATS].delete_many({"_id": {"$nin": reviewed}})
+    return await db[MOVIE_STATS].count_documents({}), result.deleted_count
+
+async def main():
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        rebuilt, removed = await rebuild(client[os.getenv('MONGODB_DB_NAME', 'pro')])
+        print(f"Rebuilt stats for {rebuilt} movies, removed {removed}")
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor
+import numpy as np
+from pymongo import AsyncMongoClient, ReplaceOne
+from model import utc_now
+from repository import COLLECTION_VERSIONS
+from ratings import MOVIE_STATS
+
+RECOMMENDATIONS = "recommendations"
+RECOMMENDATION_SIZE = int(os.getenv('RECOMMENDATION_SIZE', '20'))
+RECOMMENDATION_WORKERS = int(os.getenv('RECOMMENDATION_WORKERS', str(os.cpu_count() or 1)))
+# Cada lote arma una matriz de lote x peliculas en float32 (500 x 50k = 100MB)
+RECOMMENDATION_BATCH_SIZE = int(os.getenv('RECOMMENDATION_BATCH_SIZE', '500'))
+
+PREFERENCE_WEIGHT = 1.0
+WATCHLIST_WEIGHT = 2.0
+BOOKING_WEIGHT = 3.0
+POPULARITY_WEIGHT = 0.5
+SIGNAL_PROJECTION = {"preferences": 1, "watchlist": 1, "booking_history": 1, "rating_reviews": 1, "version": 1}
+
+# Recomendaciones por afinidad de genero: la afinidad usuario x genero sale de
+# preferences, watchlist, booking_history y rating_reviews (el resumen reciente
+# del documento), y el puntaje es afinidad @ (pelicula x genero).T mas un termino
+# de popularidad tomado de movie_stats. Las peliculas ya vistas se excluyen.
+# El resultado se guarda en RECOMMENDATIONS con la version del catalogo y la del
+# usuario; si alguna cambio, se recalcula al pedirlo.
+
+def split_genres(genre):
+    return [part.strip() for part in (genre or "").split(",") if part.strip()]
+
+class Catalog:
+    def __init__(self, movies, stats, version):
+        self.version = version
+        self.movie_ids = [movie["_id"] for movie in movies]
+        self.positions = {}
+        genres = sorted({genre for movie in movies for genre in split_genres(movie.get("genre"))})
+        self.genres = {genre: col for col, genre in enumerate(genres)}
+        self.matrix = np.zeros((len(movies), len(genres)), dtype=np.float32)
+        for row, movie in enumerate(movies):
+            # watchlist puede tener ids o titulos
+            self.positions[movie["_id"]] = row
+            self.positions.setdefault(movie.get("title"), row)
+            movie_genres = split_genres(movie.get("genre"))
+            for genre in movie_genres:
+                self.matrix[row, self.genres[genre]] = 1 / len(movie_genres)
+        means = {doc["_id"]: doc.get("mean") or 0 for doc in stats}
+        self.popularity = np.array([means.get(movie_id, 0) / 5 * POPULARITY_WEIGHT for movie_id in self.movie_ids], dtype=np.float32)
+
+    def signals(self, users):
+        pref_rows, pref_cols, pref_weights = [], [], []
+        movie_rows, movie_cols, movie_weights = [], [], []
+        def add_movie(row, item, weight):
+            if (col := self.positions.get(item)) is not None:
+                movie_rows.append(row)
+                movie_cols.append(col)
+                movie_weights.append(weight)
+        for row, user in enumerate(users):
+            for genre in user.get("preferences") or []:
+                if (col := self.genres.get(genre)) is not None:
+                    pref_rows.append(row)
+                    pref_cols.append(col)
+                    pref_weights.append(PREFERENCE_WEIGHT)
+            for item in user.get("watchlist") or []:
+                add_movie(row, item, WATCHLIST_WEIGHT)
+            for booking in user.get("booking_history") or []:
+                add_movie(row, booking.get("movie_id"), BOOKING_WEIGHT)
+            for review in user.get("rating_reviews") or []:
+                if isinstance(review.get("rating"), (int, float)):
+                    # 5 estrellas suma, 1 estrella resta
+                    add_movie(row, review.get("movie_id"), review["rating"] - 3)
+        return (
+            np.array(pref_rows, dtype=np.int64), np.array(pref_cols, dtype=np.int64), np.array(pref_weights, dtype=np.float32),
+            np.array(movie_rows, dtype=np.int64), np.array(movie_cols, dtype=np.int64), np.array(movie_weights, dtype=np.float32),
+        )
+
+    def documents(self, users, top, scores):
+        now = utc_now().isoformat()
+        docs = []
+        for user, movies, movie_scores in zip(users, top, scores):
+            keep = np.isfinite(movie_scores)
+            docs.append({
+                "_id": user["_id"],
+                "movies": [self.movie_ids[col] for col in movies[keep]],
+                "scores": [round(float(score), 4) for score in movie_scores[keep]],
+                "catalog_version": self.version,
+                "user_version": user.get("version", 0),
+                "computed_at": now,
+            })
+        return docs
+
+def score(matrix, popularity, signals, n_users, limit):
+    pref_rows, pref_cols, pref_weights, movie_rows, movie_cols, movie_weights = signals
+    affinity = np.zeros((n_users, matrix.shape[1]), dtype=np.float32)
+    np.add.at(affinity, (pref_rows, pref_cols), pref_weights)
+    np.add.at(affinity, movie_rows, movie_weights[:, None] * matrix[movie_cols])
+    scores = affinity @ matrix.T + popularity
+    scores[movie_rows, movie_cols] = -np.inf
+    limit = min(limit, scores.shape[1])
+    if limit == 0:
+        return np.zeros((n_users, 0), dtype=np.int64), np.zeros((n_users, 0), dtype=np.float32)
+    top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+# El catalogo se copia una vez a cada proceso del pool, no en cada lote
+worker_catalog = None
+
+def init_worker(matrix, popularity):
+    global worker_catalog
+    worker_catalog = (matrix, popularity)
+
+def score_in_worker(signals, n_users, limit):
+    return score(*worker_catalog, signals, n_users, limit)
+
+async def catalog_version(db):
+    doc = await db[COLLECTION_VERSIONS].find_one({"_id": "movies"})
+    return doc["version"] if doc else 0
+
+async def load_catalog(db, version):
+    movies = await db["movies"].find({}, {"title": 1, "genre": 1}).sort("_id", 1).to_list(length=None)
+    stats = await db[MOVIE_STATS].find({}, {"mean": 1}).to_list(length=None)
+    # Construir las matrices es CPU puro: fuera del event loop
+    return await asyncio.get_running_loop().run_in_executor(None, Catalog, movies, stats, version)
+
+# Catalogo del proceso del API, recargado solo cuando cambia la version de movies.
+# El lock hace que los requests concurrentes esperen una sola recarga.
+current_catalog = None
+catalog_lock = asyncio.Lock()
+
+async def get_catalog(db, version):
+    global current_catalog
+    if current_catalog is None or current_catalog.version != version:
+        async with catalog_lock:
+            if current_catalog is None or current_catalog.version != version:
+                current_catalog = await load_catalog(db, version)
+    return current_catalog
+
+async def for_user(db, user_id):
+    user, version, doc = await asyncio.gather(
+        db["users"].find_one({"_id": user_id}, SIGNAL_PROJECTION),
+        catalog_version(db),
+        db[RECOMMENDATIONS].find_one({"_id": user_id}),
+    )
+    if user is None:
+        return None
+    if doc is not None and doc["catalog_version"] == version and doc["user_version"] == user.get("version", 0):
+        return doc
+    catalog = await get_catalog(db, version)
+    top, scores = score(catalog.matrix, catalog.popularity, catalog.signals([user]), 1, RECOMMENDATION_SIZE)
+    doc = catalog.documents([user], top, scores)[0]
+    await db[RECOMMENDATIONS].replace_one({"_id": user_id}, doc, upsert=True)
+    return doc
+
+async def user_batches(db, batch_size):
+    batch = []
+    async for user in db["users"].find({}, SIGNAL_PROJECTION, batch_size=batch_size):
+        batch.append(user)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def recommend_all(db, workers=RECOMMENDATION_WORKERS, batch_size=RECOMMENDATION_BATCH_SIZE):
+    # Job por lotes: los lotes se puntuan en paralelo en un pool de procesos
+    # mientras el event loop sigue leyendo usuarios y escribiendo resultados
+    catalog = await load_catalog(db, await catalog_version(db))
+    loop = asyncio.get_running_loop()
+    computed = 0
+    async def run(pool, users):
+        top, scores = await loop.run_in_executor(pool, score_in_worker, catalog.signals(users), len(users), RECOMMENDATION_SIZE)
+        docs = catalog.documents(users, top, scores)
+        await db[RECOMMENDATIONS].bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+        return len(docs)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(catalog.matrix, catalog.popularity)) as pool:
+        pending = set()
+        async for users in user_batches(db, batch_size):
+            pending.add(asyncio.ensure_future(run(pool, users)))
+            if len(pending) >= workers * 2:
+                done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+                computed += sum(task.result() for task in done)
+                print(f"Computed recommendations for {computed} users")
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            computed += sum(task.result() for task in done)
+    return computed
+
+async def main():
+    client = AsyncMongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    try:
+        computed = await recommend_all(client[os.getenv('MONGODB_DB_NAME', 'pro')])
+        print(f"Computed recommendations for {computed} users")
+    finally:
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,308 @@
+import base64
+import hashlib
+import json
+import os
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+EXPORT_BATCH_SIZE = 1000
+MAX_BULK_SIZE = 10000
+COLLECTION_VERSIONS = "collection_versions"
+FAST_RESPONSES = os.getenv('FAST_RESPONSES', 'false').lower() == 'true'
+
+# Paginacion por cursor (keyset) y proyeccion de campos
+def encode_cursor(doc, sort_field="_id"):
+    key = [doc.get(sort_field), doc["_id"]]
+    return base64.urlsafe_b64encode(json.dumps(key, default=str).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor {cursor}")
+    return value, last_id
+
+def build_projection(model, fields):
+    if not fields:
+        return None
+    known = {name: info.alias or name for name, info in model.model_fields.items()}
+    known.update({alias: alias for alias in known.values()})
+    projection = {"_id": 1}
+    for field in (f.strip() for f in fields.split(",")):
+        if not field:
+            continue
+        if field not in known:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown field {field} for {model.__name__}")
+        projection[known[field]] = 1
+    return projection
+
+# Serializacion directa de los documentos de Mongo, sin construir modelos
+def dump_json(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str).encode()
+
+def model_projection(model):
+    return {info.alias or name: 1 for name, info in model.model_fields.items()}
+
+def parse_ids(ids):
+    ids = [id for id in (part.strip() for part in ids.split(",")) if id]
+    if len(ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_PAGE_SIZE} ids per request")
+    return ids
+
+async def paginate(collection, response, model, limit, after=None, fields=None, query=None, sort_field="_id", archive=None):
+    query = dict(query or {})
+    projection = build_projection(model, fields)
+    if projection is None and FAST_RESPONSES:
+        # Proyectar los campos del modelo en Mongo en lugar de validarlos en Python
+        projection = model_projection(model)
+    if after:
+        value, last_id = decode_cursor(after)
+        if sort_field == "_id":
+            query["_id"] = {**query.get("_id", {}), "$gt": last_id}
+        else:
+            query["$or"] = [{sort_field: {"$gt": value}}, {sort_field: value, "_id": {"$gt": last_id}}]
+    sort = [("_id", 1)] if sort_field == "_id" else [(sort_field, 1), ("_id", 1)]
+    if projection and sort_field not in projection:
+        projection[sort_field] = 1
+    if archive:
+        # Misma pagina sobre la coleccion caliente y su archivo, cada lado ya ordenado y acotado
+        side = [{"$match": query}, {"$sort": dict(sort)}, {"$limit": limit + 1}] + ([{"$project": projection}] if projection else [])
+        pipeline = side + [{"$unionWith": {"coll": archive, "pipeline": side}}, {"$sort": dict(sort)}, {"$limit": limit + 1}]
+        docs = await (await collection.aggregate(pipeline)).to_list(length=limit + 1)
+    else:
+        docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort_field)
+    if projection:
+        # Los documentos parciales no pasan la validacion del response_model,
+        # y en modo rapido los documentos ya tienen la forma del modelo
+        return Response(content=dump_json(docs), media_type="application/json", headers=headers)
+    response.headers.update(headers)
+    return docs
+
+# Exportacion NDJSON en streaming, sin materializar la coleccion
+def export_ndjson(collection, model, fields=None):
+    cursor = collection.find({}, build_projection(model, fields), batch_size=EXPORT_BATCH_SIZE)
+    async def generate():
+        try:
+            lines = []
+            async for doc in cursor:
+                lines.append(dump_json(doc))
+                if len(lines) == EXPORT_BATCH_SIZE:
+                    yield b"\n".join(lines) + b"\n"
+                    lines = []
+            if lines:
+                yield b"\n".join(lines) + b"\n"
+        finally:
+            await cursor.close()
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+# Insercion masiva: acepta un arreglo JSON o NDJSON y reporta errores por fila
+async def read_bulk_rows(request):
+    body = await request.body()
+    if "ndjson" in request.headers.get("content-type", ""):
+        rows = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(e)
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array or NDJSON")
+    if len(rows) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {MAX_BULK_SIZE} rows per request")
+    return rows
+
+async def bulk_insert(request, collection, model, prepare=None, after_insert=None):
+    rows = await read_bulk_rows(request)
+    encoded, docs, positions, errors = [], [], [], []
+    for index, row in enumerate(rows):
+        if isinstance(row, Exception):
+            errors.append({"index": index, "error": f"Invalid JSON: {row}"})
+            continue
+        try:
+            raw = jsonable_encoder(model.model_validate(row))
+            doc = prepare(raw) if prepare else raw
+            doc["version"] = 1
+            encoded.append(raw)
+            docs.append(doc)
+            positions.append(index)
+        except ValidationError as e:
+            errors.append({"index": index, "error": "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())})
+    inserted_count = 0
+    failed = set()
+    if docs:
+        try:
+            result = await collection.insert_many(docs, ordered=False)
+            inserted_count = len(result.inserted_ids)
+        except BulkWriteError as e:
+            inserted_count = e.details["nInserted"]
+            for write_error in e.details["writeErrors"]:
+                failed.add(write_error["index"])
+                errors.append({"index": positions[write_error["index"]], "error": write_error["errmsg"]})
+    if after_insert and inserted_count:
+        await after_insert(collection.database, [raw for i, raw in enumerate(encoded) if i not in failed])
+    errors.sort(key=lambda error: error["index"])
+    return {"inserted_count": inserted_count, "errors": errors}
+
+# Versiones y ETags: cada documento lleva `version`, que sube en cada escritura,
+# y las colecciones con list_etag llevan un contador en COLLECTION_VERSIONS.
+def document_etag(doc):
+    return f'"{doc["_id"]}-{doc.get("version", 0)}"'
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+def not_modified(etag):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+# Capa CRUD comun a todos los routers: una sola ida y vuelta a Mongo por escritura
+class Repository:
+    def __init__(self, model, cached=False, list_etag=False, prepare=None, after_insert=None, read_only_fields=(), archive=None):
+        self.model = model
+        self.name = model.collection
+        self.label = model.__name__
+        self.cached = cached
+        self.list_etag = list_etag
+        # Ganchos para modelos cuyo documento guardado no es igual al recibido
+        self.prepare = prepare
+        self.after_insert = after_insert
+        self.read_only_fields = set(read_only_fields)
+        # Coleccion con los documentos frios, solo se lee con include_archived
+        self.archive = archive
+
+    def collection(self, request):
+        return request.app.database[self.name]
+
+    def not_found(self, id):
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{self.label} with ID {id} not found")
+
+    def conflict(self, error):
+        # keyValue trae el campo repetido: _id o un indice unico como users.email
+        key = ", ".join(f"{field} {value}" for field, value in (error.details or {}).get("keyValue", {}).items())
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"{self.label} with {key or 'the same key'} already exists")
+
+    async def touch(self, request):
+        if self.list_etag:
+            await request.app.database[COLLECTION_VERSIONS].update_one({"_id": self.name}, {"$inc": {"version": 1}}, upsert=True)
+
+    async def list_version(self, request):
+        doc = await request.app.database[COLLECTION_VERSIONS].find_one({"_id": self.name})
+        return doc["version"] if doc else 0
+
+    async def create(self, request, item):
+        raw = jsonable_encoder(item)
+        doc = self.prepare(raw) if self.prepare else raw
+        doc["version"] = 1
+        try:
+            await self.collection(request).insert_one(doc)
+        except DuplicateKeyError as e:
+            raise self.conflict(e)
+        if self.after_insert:
+            await self.after_insert(request.app.database, [raw])
+        await self.touch(request)
+        return doc
+
+    async def bulk_create(self, request):
+        result = await bulk_insert(request, self.collection(request), self.model, self.prepare, self.after_insert)
+        if result["inserted_count"]:
+            await self.touch(request)
+        return result
+
+    async def list(self, request, response, limit, after=None, fields=None, query=None, sort_field="_id", ids=None, include_archived=False):
+        if ids:
+            # Lectura de varios documentos por id en una sola consulta $in
+            query = {**(query or {}), "_id": {"$in": parse_ids(ids)}}
+        if self.list_etag:
+            # El ETag depende de la version de la coleccion y de los parametros de la consulta
+            params = hashlib.sha1(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:16]
+            etag = f'"{self.name}-{await self.list_version(request)}-{params}"'
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            response.headers["ETag"] = etag
+        archive = self.archive if include_archived else None
+        page = await paginate(self.collection(request), response, self.model, limit, after, fields, query, sort_field, archive)
+        if isinstance(page, Response) and "ETag" in response.headers:
+            page.headers["ETag"] = response.headers["ETag"]
+        return page
+
+    def export(self, request, fields=None):
+        return export_ndjson(self.collection(request), self.model, fields)
+
+    async def get(self, request, response, id, include_archived=False):
+        if include_archived and self.archive:
+            # Primero la coleccion caliente y, si no esta, el archivo
+            doc = await self.collection(request).find_one({"_id": id})
+            if doc is None:
+                doc = await request.app.database[self.archive].find_one({"_id": id})
+        elif self.cached:
+            doc = await request.app.cache.get_or_load(f"{self.name}:{id}", lambda: self.collection(request).find_one({"_id": id}))
+        else:
+            if request.headers.get("if-none-match"):
+                # Revisar solo la version antes de leer el documento completo
+                if (current := await self.collection(request).find_one({"_id": id}, {"version": 1})) is None:
+                    raise self.not_found(id)
+                if etag_matches(request, etag := document_etag(current)):
+                    return not_modified(etag)
+            doc = await self.collection(request).find_one({"_id": id})
+        if doc is None:
+            raise self.not_found(id)
+        etag = document_etag(doc)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        return doc
+
+    async def update(self, request, response, id, item):
+        updated_data = jsonable_encoder(item, exclude={"id", *self.read_only_fields}, exclude_none=True)
+        if not updated_data:
+            return await self.get(request, response, id)
+        try:
+            doc = await self.collection(request).find_one_and_update(
+                {"_id": id}, {"$set": updated_data, "$inc": {"version": 1}}, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError as e:
+            raise self.conflict(e)
+        if self.cached:
+            await request.app.cache.invalidate(f"{self.name}:{id}")
+        if doc is None:
+            raise self.not_found(id)
+        await self.touch(request)
+        response.headers["ETag"] = document_etag(doc)
+        return doc
+
+    async def delete(self, request, id):
+        delete_result = await self.collection(request).delete_one({"_id": id})
+        if self.cached:
+            await request.app.cache.invalidate(f"{self.name}:{id}")
+        if delete_result.deleted_count == 1:
+            await self.touch(request)
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+        raise self.not_found(id)
@@ -1,218 +1,363 @@
-from fastapi import APIRouter, Body, Request, Response, HTTPException, status
-from fastapi.encoders import jsonable_encoder
-from typing import List
-from model import User, Movie, Showtime, Theater, Notification
+from datetime import datetime
+from fastapi import APIRouter, BackgroundTasks, Body, Query, Request, Response, HTTPException, status
+from fastapi.responses import StreamingResponse
+from pymongo import ReturnDocument
+from typing import List, Optional
+from model import naive_utc, utc_now, User, Recommendations, Movie, MovieStats, Showtime, Theater, Notification, MarkRead, ScheduleEntry, Booking, BulkResult, SeatHoldRequest, SeatHold, SeatMap
+from repository import Repository, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, parse_ids
+from history import HISTORY, HISTORY_FIELDS, HistoryKind
+from ratings import MovieSort
+import archive
+import fanout
+import history
+import ratings
+import recommendations
+import seats
 
 user_router = APIRouter()
 movie_router = APIRouter()
 showtime_router = APIRouter()
 theater_router = APIRouter()
 notification_router = APIRouter()
+schedule_router = APIRouter()
+
+async def write_user_histories(db, docs):
+    await history.write_user_histories(db, docs)
+    await ratings.record_user_reviews(db, docs)
+
+users = Repository(User, prepare=history.split_user, after_insert=write_user_histories, read_only_fields=[*HISTORY, "history_counts"])
+movies = Repository(Movie, cached=True, list_etag=True)
+showtimes = Repository(Showtime, archive=archive.ARCHIVES["showtimes"])
+theaters = Repository(Theater, cached=True, list_etag=True)
+notifications = Repository(Notification, archive=archive.ARCHIVES["notifications"])
+
+def showtime_query(movie_id=None, theater_id=None, from_=None, to=None, min_seats=None):
+    query = {}
+    if movie_id:
+        query["movie_id"] = movie_id
+    if theater_id:
+        query["theater_id"] = theater_id
+    if from_ or to:
+        # Las fechas se guardan en ISO 8601 UTC sin offset, que ordena igual que el texto
+        query["showtime"] = {}
+        if from_:
+            query["showtime"]["$gte"] = naive_utc(from_).isoformat()
+        if to:
+            query["showtime"]["$lt"] = naive_utc(to).isoformat()
+    if min_seats is not None:
+        query["available_seats"] = {"$gte": min_seats}
+    return query
 
 # Rutas para User
 @user_router.post("/", response_description="Create a new user", status_code=status.HTTP_201_CREATED, response_model=User)
-def create_user(request: Request, user: User = Body(...)):
-    user = jsonable_encoder(user)
-    new_user = request.app.database["users"].insert_one(user)
-    created_user = request.app.database["users"].find_one({"_id": new_user.inserted_id})
-    return created_user
+async def create_user(request: Request, user: User = Body(...)):
+    return await users.create(request, user)
+
+@user_router.post("/bulk", response_description="Create many users", response_model=BulkResult)
+async def create_users_bulk(request: Request):
+    return await users.bulk_create(request)
 
 @user_router.get("/", response_description="Get all users", response_model=List[User])
-def list_users(request: Request):
-    users = list(request.app.database["users"].find())
-    return users
+async def list_users(request: Request, response: Response, ids: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None, fields: Optional[str] = None):
+    return await users.list(request, response, limit, after, fields, ids=ids)
+
+@user_router.get("/export", response_description="Stream all users as NDJSON", response_class=StreamingResponse)
+async def export_users(request: Request, fields: Optional[str] = None):
+    return users.export(request, fields)
 
 @user_router.get("/{id}", response_description="Get a single user by id", response_model=User)
-def find_user(id: str, request: Request):
-    if (user := request.app.database["users"].find_one({"_id": id})) is not None:
-        return user
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with ID {id} not found")
+async def find_user(id: str, request: Request, response: Response):
+    return await users.get(request, response, id)
 
 @user_router.put("/{id}", response_description="Update a user by id", response_model=User)
-def update_user(id: str, request: Request, user: User = Body(...)):
-    updated_data = {k: v for k, v in user.dict().items() if v is not None}
-    if updated_data:
-        update_result = request.app.database["users"].update_one({"_id": id}, {"$set": updated_data})
-        if update_result.modified_count == 1:
-            if (updated_user := request.app.database["users"].find_one({"_id": id})) is not None:
-                return updated_user
-    if (existing_user := request.app.database["users"].find_one({"_id": id})) is not None:
-        return existing_user
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with ID {id} not found")
+async def update_user(id: str, request: Request, response: Response, user: User = Body(...)):
+    return await users.update(request, response, id, user)
+
+@user_router.get("/{id}/recommendations", response_description="Get movie recommendations for a user", response_model=Recommendations)
+async def find_user_recommendations(id: str, request: Request):
+    if (doc := await recommendations.for_user(request.app.database, id)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with ID {id} not found")
+    return doc
+
+@user_router.get("/{id}/{kind}", response_description="Get the history of a user, newest first", response_model=List[dict])
+async def list_user_history(id: str, kind: HistoryKind, request: Request, response: Response, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None):
+    entries, next_cursor = await history.list_entries(request.app.database, id, HISTORY_FIELDS[kind], limit, after)
+    # Un historial vacio puede ser de un usuario que no existe
+    if not entries and await request.app.database["users"].find_one({"_id": id}, {"_id": 1}) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with ID {id} not found")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return entries
+
+@user_router.post("/{id}/login", response_description="Record a login of a user", status_code=status.HTTP_202_ACCEPTED)
+async def login_user(id: str, request: Request):
+    now = utc_now().isoformat()
+    await request.app.activity_buffer.record(id, last_login=now, activity=[{"action": "login", "timestamp": now}])
+    return {"buffered": 1}
+
+@user_router.post("/{id}/{kind}", response_description="Append entries to the history of a user", status_code=status.HTTP_201_CREATED)
+async def append_user_history(id: str, kind: HistoryKind, request: Request, response: Response, entries: List[dict] = Body(...)):
+    if kind == HistoryKind.activity:
+        # La actividad es de alta frecuencia: se agrupa en el buffer en lugar de escribirse por request
+        await request.app.activity_buffer.record(id, activity=entries)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"buffered": len(entries)}
+    if not await history.append(request.app.database, id, {HISTORY_FIELDS[kind]: entries}):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with ID {id} not found")
+    if kind == HistoryKind.reviews:
+        await ratings.record_reviews(request.app.database, entries)
+    return {"appended": len(entries)}
 
 @user_router.delete("/{id}", response_description="Delete a user")
-def delete_user(id: str, request: Request, response: Response):
-    delete_result = request.app.database["users"].delete_one({"_id": id})
-    if delete_result.deleted_count == 1:
-        response.status_code = status.HTTP_204_NO_CONTENT
-        return response
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with ID {id} not found")
+async def delete_user(id: str, request: Request):
+    response = await users.delete(request, id)
+    await ratings.forget_user_reviews(request.app.database, id)
+    await history.delete_user_histories(request.app.database, id)
+    await request.app.database[recommendations.RECOMMENDATIONS].delete_one({"_id": id})
+    return response
 
 # Rutas para Movie
 @movie_router.post("/", response_description="Create a new movie", status_code=status.HTTP_201_CREATED, response_model=Movie)
-def create_movie(request: Request, movie: Movie = Body(...)):
-    movie = jsonable_encoder(movie)
-    new_movie = request.app.database["movies"].insert_one(movie)
-    created_movie = request.app.database["movies"].find_one({"_id": new_movie.inserted_id})
-    return created_movie
+async def create_movie(request: Request, movie: Movie = Body(...)):
+    return await movies.create(request, movie)
+
+@movie_router.post("/bulk", response_description="Create many movies", response_model=BulkResult)
+async def create_movies_bulk(request: Request):
+    return await movies.bulk_create(request)
 
 @movie_router.get("/", response_description="Get all movies", response_model=List[Movie])
-def list_movies(request: Request):
-    movies = list(request.app.database["movies"].find())
-    return movies
+async def list_movies(request: Request, response: Response, genre: Optional[str] = None, ids: Optional[str] = None, sort: MovieSort = MovieSort.id,
+                      limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None, fields: Optional[str] = None):
+    if sort == MovieSort.rating:
+        # Ordenadas por la media precalculada en movie_stats; solo peliculas con calificaciones
+        docs, next_cursor = await ratings.list_by_rating(request.app.database, limit, after, genre, parse_ids(ids) if ids else None)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return docs
+    query = {"genre": genre} if genre else {}
+    return await movies.list(request, response, limit, after, fields, query, ids=ids)
+
+@movie_router.get("/export", response_description="Stream all movies as NDJSON", response_class=StreamingResponse)
+async def export_movies(request: Request, fields: Optional[str] = None):
+    return movies.export(request, fields)
 
 @movie_router.get("/{id}", response_description="Get a single movie by id", response_model=Movie)
-def find_movie(id: str, request: Request):
-    if (movie := request.app.database["movies"].find_one({"_id": id})) is not None:
-        return movie
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Movie with ID {id} not found")
+async def find_movie(id: str, request: Request, response: Response):
+    return await movies.get(request, response, id)
+
+@movie_router.get("/{id}/stats", response_description="Get the rating stats of a movie", response_model=MovieStats)
+async def find_movie_stats(id: str, request: Request):
+    if (stats := await ratings.find_stats(request.app.database, id)) is not None:
+        return stats
+    # Sin resenas todavia: solo comprobar que la pelicula existe
+    if await request.app.database["movies"].find_one({"_id": id}, {"_id": 1}) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Movie with ID {id} not found")
+    return {"_id": id}
 
 @movie_router.put("/{id}", response_description="Update a movie by id", response_model=Movie)
-def update_movie(id: str, request: Request, movie: Movie = Body(...)):
-    updated_data = {k: v for k, v in movie.dict().items() if v is not None}
-    if updated_data:
-        update_result = request.app.database["movies"].update_one({"_id": id}, {"$set": updated_data})
-        if update_result.modified_count == 1:
-            if (updated_movie := request.app.database["movies"].find_one({"_id": id})) is not None:
-                return updated_movie
-    if (existing_movie := request.app.database["movies"].find_one({"_id": id})) is not None:
-        return existing_movie
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Movie with ID {id} not found")
+async def update_movie(id: str, request: Request, response: Response, movie: Movie = Body(...)):
+    return await movies.update(request, response, id, movie)
 
 @movie_router.delete("/{id}", response_description="Delete a movie")
-def delete_movie(id: str, request: Request, response: Response):
-    delete_result = request.app.database["movies"].delete_one({"_id": id})
-    if delete_result.deleted_count == 1:
-        response.status_code = status.HTTP_204_NO_CONTENT
-        return response
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Movie with ID {id} not found")
+async def delete_movie(id: str, request: Request):
+    response = await movies.delete(request, id)
+    await request.app.database[ratings.MOVIE_STATS].delete_one({"_id": id})
+    return response
 
 # Rutas para Showtime
 @showtime_router.post("/", response_description="Create a new showtime", status_code=status.HTTP_201_CREATED, response_model=Showtime)
-def create_showtime(request: Request, showtime: Showtime = Body(...)):
-    showtime = jsonable_encoder(showtime)
-    new_showtime = request.app.database["showtimes"].insert_one(showtime)
-    created_showtime = request.app.database["showtimes"].find_one({"_id": new_showtime.inserted_id})
-    return created_showtime
+async def create_showtime(request: Request, showtime: Showtime = Body(...)):
+    return await showtimes.create(request, showtime)
+
+@showtime_router.post("/bulk", response_description="Create many showtimes", response_model=BulkResult)
+async def create_showtimes_bulk(request: Request):
+    return await showtimes.bulk_create(request)
 
 @showtime_router.get("/", response_description="Get all showtimes", response_model=List[Showtime])
-def list_showtimes(request: Request):
-    showtimes = list(request.app.database["showtimes"].find())
-    return showtimes
+async def list_showtimes(request: Request, response: Response, movie_id: Optional[str] = None, theater_id: Optional[str] = None,
+                         from_: Optional[datetime] = Query(None, alias="from"), to: Optional[datetime] = None, min_seats: Optional[int] = Query(None, ge=0),
+                         ids: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None, fields: Optional[str] = None,
+                         include_archived: bool = False):
+    query = showtime_query(movie_id, theater_id, from_, to, min_seats)
+    return await showtimes.list(request, response, limit, after, fields, query, sort_field="showtime", ids=ids, include_archived=include_archived)
+
+@showtime_router.get("/export", response_description="Stream all showtimes as NDJSON", response_class=StreamingResponse)
+async def export_showtimes(request: Request, fields: Optional[str] = None):
+    return showtimes.export(request, fields)
 
 @showtime_router.get("/{id}", response_description="Get a single showtime by id", response_model=Showtime)
-def find_showtime(id: str, request: Request):
-    if (showtime := request.app.database["showtimes"].find_one({"_id": id})) is not None:
-        return showtime
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Showtime with ID {id} not found")
+async def find_showtime(id: str, request: Request, response: Response, include_archived: bool = False):
+    return await showtimes.get(request, response, id, include_archived)
 
 @showtime_router.put("/{id}", response_description="Update a showtime by id", response_model=Showtime)
-def update_showtime(id: str, request: Request, showtime: Showtime = Body(...)):
-    updated_data = {k: v for k, v in showtime.dict().items() if v is not None}
-    if updated_data:
-        update_result = request.app.database["showtimes"].update_one({"_id": id}, {"$set": updated_data})
-        if update_result.modified_count == 1:
-            if (updated_showtime := request.app.database["showtimes"].find_one({"_id": id})) is not None:
-                return updated_showtime
-    if (existing_showtime := request.app.database["showtimes"].find_one({"_id": id})) is not None:
-        return existing_showtime
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Showtime with ID {id} not found")
+async def update_showtime(id: str, request: Request, response: Response, showtime: Showtime = Body(...)):
+    doc = await showtimes.update(request, response, id, showtime)
+    # El mapa de asientos copia el contador reescrito
+    await request.app.database[seats.SEAT_MAPS].update_one({"_id": id}, {"$set": {"available_seats": doc["available_seats"]}})
+    return doc
+
+@showtime_router.post("/{id}/book", response_description="Book seats for a showtime", response_model=Showtime)
+async def book_showtime(id: str, request: Request, booking: Booking = Body(...)):
+    # Descuento condicional y atomico: nunca se venden mas asientos de los disponibles
+    showtime = await request.app.database["showtimes"].find_one_and_update(
+        {"_id": id, "available_seats": {"$gte": booking.quantity}},
+        {"$inc": {"available_seats": -booking.quantity, "version": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if showtime is None:
+        if await request.app.database["showtimes"].find_one({"_id": id}, {"_id": 1}) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Showtime with ID {id} not found")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Not enough seats available for showtime {id}")
+    await request.app.database[seats.SEAT_MAPS].update_one({"_id": id}, {"$inc": {"available_seats": -booking.quantity}})
+    entry = {
+        "movie_id": showtime["movie_id"],
+        "showtime_id": id,
+        "theater_id": showtime["theater_id"],
+        "quantity": booking.quantity,
+        "booking_date": utc_now().isoformat(),
+    }
+    try:
+        if not await history.append(request.app.database, booking.user_id, {"booking_history": [entry]}):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with ID {booking.user_id} not found")
+    except Exception:
+        # Devolver los asientos si el usuario no existe o el historial no se escribe
+        await seats.add_available_seats(request.app.database, id, booking.quantity)
+        raise
+    return showtime
+
+@showtime_router.post("/{id}/announce", response_description="Notify every user with the movie on their watchlist", status_code=status.HTTP_202_ACCEPTED)
+async def announce_showtime(id: str, request: Request, background_tasks: BackgroundTasks):
+    if await request.app.database["showtimes"].find_one({"_id": id}, {"_id": 1}) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Showtime with ID {id} not found")
+    # El fan-out puede ser de cientos de miles de usuarios: se hace despues de responder
+    background_tasks.add_task(fanout.fan_out_showtime, request.app.database, id)
+    return {"scheduled": id}
+
+@showtime_router.get("/{id}/seats", response_description="Get the seat map of a showtime", response_model=SeatMap)
+async def find_showtime_seats(id: str, request: Request):
+    return seats.seat_map_view(await seats.load_seat_map(request.app.database, id))
+
+@showtime_router.post("/{id}/holds", response_description="Hold seats of a showtime", status_code=status.HTTP_201_CREATED, response_model=SeatHold)
+async def hold_showtime_seats(id: str, request: Request, hold: SeatHoldRequest = Body(...)):
+    return await seats.hold_seats(request.app.database, id, hold.seats, hold.ttl_seconds)
+
+@showtime_router.post("/{id}/holds/{hold_id}/confirm", response_description="Confirm held seats", response_model=SeatMap)
+async def confirm_showtime_hold(id: str, hold_id: str, request: Request):
+    return seats.seat_map_view(await seats.confirm_hold(request.app.database, id, hold_id))
+
+@showtime_router.delete("/{id}/holds/{hold_id}", response_description="Release held seats")
+async def release_showtime_hold(id: str, hold_id: str, request: Request, response: Response):
+    await seats.release_hold(request.app.database, id, hold_id)
+    response.status_code = status.HTTP_204_NO_CONTENT
+    return response
 
 @showtime_router.delete("/{id}", response_description="Delete a showtime")
-def delete_showtime(id: str, request: Request, response: Response):
-    delete_result = request.app.database["showtimes"].delete_one({"_id": id})
-    if delete_result.deleted_count == 1:
-        response.status_code = status.HTTP_204_NO_CONTENT
-        return response
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Showtime with ID {id} not found")
+async def delete_showtime(id: str, request: Request):
+    return await showtimes.delete(request, id)
 
 # Rutas para Theater
 @theater_router.post("/", response_description="Create a new theater", status_code=status.HTTP_201_CREATED, response_model=Theater)
-def create_theater(request: Request, theater: Theater = Body(...)):
-    theater = jsonable_encoder(theater)
-    new_theater = request.app.database["theaters"].insert_one(theater)
-    created_theater = request.app.database["theaters"].find_one({"_id": new_theater.inserted_id})
-    return created_theater
+async def create_theater(request: Request, theater: Theater = Body(...)):
+    return await theaters.create(request, theater)
+
+@theater_router.post("/bulk", response_description="Create many theaters", response_model=BulkResult)
+async def create_theaters_bulk(request: Request):
+    return await theaters.bulk_create(request)
 
 @theater_router.get("/", response_description="Get all theaters", response_model=List[Theater])
-def list_theaters(request: Request):
-    theaters = list(request.app.database["theaters"].find())
-    return theaters
+async def list_theaters(request: Request, response: Response, ids: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None, fields: Optional[str] = None):
+    return await theaters.list(request, response, limit, after, fields, ids=ids)
+
+@theater_router.get("/export", response_description="Stream all theaters as NDJSON", response_class=StreamingResponse)
+async def export_theaters(request: Request, fields: Optional[str] = None):
+    return theaters.export(request, fields)
 
 @theater_router.get("/{id}", response_description="Get a single theater by id", response_model=Theater)
-def find_theater(id: str, request: Request):
-    if (theater := request.app.database["theaters"].find_one({"_id": id})) is not None:
-        return theater
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Theater with ID {id} not found")
+async def find_theater(id: str, request: Request, response: Response):
+    return await theaters.get(request, response, id)
 
 @theater_router.put("/{id}", response_description="Update a theater by id", response_model=Theater)
-def update_theater(id: str, request: Request, theater: Theater = Body(...)):
-    updated_data = {k: v for k, v in theater.dict().items() if v is not None}
-    if updated_data:
-        update_result = request.app.database["theaters"].update_one({"_id": id}, {"$set": updated_data})
-        if update_result.modified_count == 1:
-            if (updated_theater := request.app.database["theaters"].find_one({"_id": id})) is not None:
-                return updated_theater
-    if (existing_theater := request.app.database["theaters"].find_one({"_id": id})) is not None:
-        return existing_theater
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Theater with ID {id} not found")
+async def update_theater(id: str, request: Request, response: Response, theater: Theater = Body(...)):
+    return await theaters.update(request, response, id, theater)
 
 @theater_router.delete("/{id}", response_description="Delete a theater")
-def delete_theater(id: str, request: Request, response: Response):
-    delete_result = request.app.database["theaters"].delete_one({"_id": id})
-    if delete_result.deleted_count == 1:
-        response.status_code = status.HTTP_204_NO_CONTENT
-        return response
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Theater with ID {id} not found")
+async def delete_theater(id: str, request: Request):
+    return await theaters.delete(request, id)
 
 # Rutas para Notification
 @notification_router.post("/", response_description="Create a new notification", status_code=status.HTTP_201_CREATED, response_model=Notification)
-def create_notification(request: Request, notification: Notification = Body(...)):
-    notification = jsonable_encoder(notification)
-    new_notification = request.app.database["notifications"].insert_one(notification)
-    created_notification = request.app.database["notifications"].find_one({"_id": new_notification.inserted_id})
-    return created_notification
+async def create_notification(request: Request, notification: Notification = Body(...)):
+    return await notifications.create(request, notification)
+
+@notification_router.post("/bulk", response_description="Create many notifications", response_model=BulkResult)
+async def create_notifications_bulk(request: Request):
+    return await notifications.bulk_create(request)
 
 @notification_router.get("/", response_description="Get all notifications", response_model=List[Notification])
-def list_notifications(request: Request):
-    notifications = list(request.app.database["notifications"].find())
-    return notifications
+async def list_notifications(request: Request, response: Response, ids: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None, fields: Optional[str] = None,
+                             include_archived: bool = False):
+    return await notifications.list(request, response, limit, after, fields, ids=ids, include_archived=include_archived)
 
-@notification_router.get("/{id}", response_description="Get a single notification by id", response_model=Notification)
-def find_notification(id: str, request: Request):
-    if (notification := request.app.database["notifications"].find_one({"_id": id})) is not None:
-        return notification
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Notification with ID {id} not found")
+@notification_router.get("/export", response_description="Stream all notifications as NDJSON", response_class=StreamingResponse)
+async def export_notifications(request: Request, fields: Optional[str] = None):
+    return notifications.export(request, fields)
 
-@notification_router.put("/{id}", response_description="Update a notification by id", response_model=Notification)
-def update_notification(id: str, request: Request, notification: Notification = Body(...)):
-    updated_data = {k: v for k, v in notification.dict().items() if v is not None}
-    if updated_data:
-        update_result = request.app.database["notifications"].update_one({"_id": id}, {"$set": updated_data})
-        if update_result.modified_count == 1:
-            if (updated_notification := request.app.database["notifications"].find_one({"_id": id})) is not None:
-                return updated_notification
-    if (existing_notification := request.app.database["notifications"].find_one({"_id": id})) is not None:
-        return existing_notification
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Notification with ID {id} not found")
+@notification_router.get("/unread-count", response_description="Count the unread notifications of a user")
+async def count_unread_notifications(request: Request, user_id: str):
+    # Se resuelve con el indice (user_id, status) sin leer los documentos
+    unread = await request.app.database["notifications"].count_documents({"user_id": user_id, "status": "unread"})
+    return {"user_id": user_id, "unread": unread}
+
+@notification_router.post("/mark-read", response_description="Mark the notifications of a user as read")
+async def mark_notifications_read(request: Request, mark: MarkRead = Body(...)):
+    query = {"user_id": mark.user_id, "status": "unread"}
+    if mark.ids is not None:
+        query["_id"] = {"$in": mark.ids}
+    now = utc_now().isoformat()
+    result = await request.app.database["notifications"].update_many(query, {"$set": {"status": "read", "read_at": now}, "$inc": {"version": 1}})
+    return {"modified_count": result.modified_count}
+
+@notification_router.get("/{id}", response_description="Get a single notification by id", response_model=Notification)
+async def find_notification(id: str, request: Request, response: Response, include_archived: bool = False):
+    return await notifications.get(request, response, id, include_archived)
 
 @notification_router.put("/{id}", response_description="Update a notification by id", response_model=Notification)
-def update_notification(id: str, request: Request, notification: Notification = Body(...)):
-    updated_data = {k: v for k, v in notification.dict().items() if v is not None}
-    if updated_data:
-        update_result = request.app.database["notifications"].update_one({"_id": id}, {"$set": updated_data})
-        if update_result.modified_count == 1:
-            if (updated_notification := request.app.database["notifications"].find_one({"_id": id})) is not None:
-                return updated_notification
-    if (existing_notification := request.app.database["notifications"].find_one({"_id": id})) is not None:
-        return existing_notification
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Notification with ID {id} not found")
+async def update_notification(id: str, request: Request, response: Response, notification: Notification = Body(...)):
+    return await notifications.update(request, response, id, notification)
 
 @notification_router.delete("/{id}", response_description="Delete a notification")
-def delete_notification(id: str, request: Request, response: Response):
-    delete_result = request.app.database["notifications"].delete_one({"_id": id})
-    if delete_result.deleted_count == 1:
-        response.status_code = status.HTTP_204_NO_CONTENT
-        return response
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Notification with ID {id} not found")
+async def delete_notification(id: str, request: Request):
+    return await notifications.delete(request, id)
 
+# Rutas para Schedule: showtimes con su pelicula y su sala en una sola agregacion
+@schedule_router.get("/", response_description="Get showtimes joined with their movie and theater", response_model=List[ScheduleEntry])
+async def list_schedule(request: Request, response: Response, location: Optional[str] = None, movie_id: Optional[str] = None, theater_id: Optional[str] = None,
+                        from_: Optional[datetime] = Query(None, alias="from"), to: Optional[datetime] = None,
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None):
+    query = showtime_query(movie_id, theater_id, from_, to)
+    if after:
+        value, last_id = decode_cursor(after)
+        query["$or"] = [{"showtime": {"$gt": value}}, {"showtime": value, "_id": {"$gt": last_id}}]
+    pipeline = [{"$match": query}, {"$sort": {"showtime": 1, "_id": 1}}]
+    if location:
+        # Filtrar por la ubicacion de la sala antes de cortar la pagina
+        pipeline += [
+            {"$lookup": {"from": "theaters", "localField": "theater_id", "foreignField": "_id", "pipeline": [{"$match": {"location": location}}], "as": "theater"}},
+            {"$unwind": "$theater"},
+            {"$limit": limit + 1},
+        ]
+    else:
+        pipeline += [
+            {"$limit": limit + 1},
+            {"$lookup": {"from": "theaters", "localField": "theater_id", "foreignField": "_id", "as": "theater"}},
+            {"$unwind": {"path": "$theater", "preserveNullAndEmptyArrays": True}},
+        ]
+    pipeline += [
+        {"$lookup": {"from": "movies", "localField": "movie_id", "foreignField": "_id", "as": "movie"}},
+        {"$unwind": {"path": "$movie", "preserveNullAndEmptyArrays": True}},
+    ]
+    entries = await (await request.app.database["showtimes"].aggregate(pipeline)).to_list(length=limit + 1)
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(entries[-1], "showtime")
+    return entries
@@ -0,0 +1,202 @@
+import base64
+import uuid
+from datetime import timedelta
+from fastapi import HTTPException, status
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+from model import utc_now
+
+SEAT_MAPS = "seat_maps"
+MAX_RETRIES = 20
+RECLAIM_BATCH_SIZE = 500
+SEAT_MAP_INDEXES = [IndexModel([("next_expiry", ASCENDING)])]
+
+# Mapa de asientos por Showtime: un bit por asiento en un campo binario.
+#   {_id: showtime_id, capacity, sold: bytes, held: bytes, version,
+#    holds: [{hold_id, seats, expires_at}], next_expiry, available_seats}
+# Todas las escrituras son compare-and-swap sobre `version`. available_seats
+# copia el contador del Showtime (el inventario) para leer el mapa de una vez:
+# cada cambio del contador se aplica tambien aqui.
+
+def empty_bitmap(capacity):
+    return bytearray((capacity + 7) // 8)
+
+def is_set(bitmap, seat):
+    return bitmap[seat >> 3] & (1 << (seat & 7)) != 0
+
+def set_bits(bitmap, seats):
+    for seat in seats:
+        bitmap[seat >> 3] |= 1 << (seat & 7)
+
+def count_bits(bitmap):
+    return sum(bin(byte).count("1") for byte in bitmap)
+
+def active_holds(doc, now):
+    return [hold for hold in doc.get("holds", []) if hold["expires_at"] > now]
+
+def held_bitmap(capacity, holds):
+    bitmap = empty_bitmap(capacity)
+    for hold in holds:
+        set_bits(bitmap, hold["seats"])
+    return bitmap
+
+def hold_fields(capacity, holds):
+    return {
+        "holds": holds,
+        "held": bytes(held_bitmap(capacity, holds)),
+        "next_expiry": min((hold["expires_at"] for hold in holds), default=None),
+    }
+
+def held_count(holds):
+    return sum(len(hold["seats"]) for hold in holds)
+
+def seat_map_view(doc, now=None):
+    # Las reservas vencidas se ignoran al leer aunque todavia no se hayan recuperado
+    holds = active_holds(doc, now or utc_now())
+    sold = bytearray(doc["sold"])
+    held = held_bitmap(doc["capacity"], holds)
+    # /book vende sin numero de asiento: el contador manda sobre los bits libres
+    available_count = max(0, min(doc["capacity"] - count_bits(sold) - count_bits(held), doc["available_seats"]))
+    return {
+        "_id": doc["_id"],
+        "capacity": doc["capacity"],
+        "sold": base64.b64encode(sold).decode(),
+        "held": base64.b64encode(held).decode(),
+        "available_count": available_count,
+    }
+
+async def add_available_seats(db, showtime_id, count):
+    # Mismo cambio en el Showtime y en su mapa, si ya existe
+    await db["showtimes"].update_one({"_id": showtime_id}, {"$inc": {"available_seats": count, "version": 1}})
+    await db[SEAT_MAPS].update_one({"_id": showtime_id}, {"$inc": {"available_seats": count}})
+
+async def load_seat_map(db, showtime_id):
+    if (doc := await db[SEAT_MAPS].find_one({"_id": showtime_id})) is not None:
+        if "available_seats" in doc:
+            return doc
+        # Mapas creados antes de copiar el contador
+        showtime = await db["showtimes"].find_one({"_id": showtime_id}, {"available_seats": 1})
+        if showtime is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Showtime with ID {showtime_id} not found")
+        await db[SEAT_MAPS].update_one({"_id": showtime_id, "available_seats": {"$exists": False}}, {"$set": {"available_seats": showtime["available_seats"]}})
+        return await db[SEAT_MAPS].find_one({"_id": showtime_id})
+    # Crear el mapa la primera vez a partir de la capacidad de la sala
+    showtime = await db["showtimes"].find_one({"_id": showtime_id}, {"theater_id": 1, "available_seats": 1})
+    if showtime is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Showtime with ID {showtime_id} not found")
+    theater = await db["theaters"].find_one({"_id": showtime["theater_id"]}, {"seating_capacity": 1})
+    if theater is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Theater with ID {showtime['theater_id']} not found")
+    # Lo ya vendido por /book (sin numero de asiento) se marca al final del mapa
+    # para que los asientos libres coincidan con available_seats
+    available = max(0, showtime.get("available_seats", theater["seating_capacity"]))
+    capacity = max(theater["seating_capacity"], available)
+    sold = empty_bitmap(capacity)
+    set_bits(sold, range(available, capacity))
+    doc = {
+        "_id": showtime_id,
+        "capacity": capacity,
+        "sold": bytes(sold),
+        "available_seats": available,
+        "version": 0,
+        **hold_fields(capacity, []),
+    }
+    try:
+        await db[SEAT_MAPS].insert_one(doc)
+    except DuplicateKeyError:
+        doc = await db[SEAT_MAPS].find_one({"_id": showtime_id})
+    return doc
+
+async def compare_and_swap(db, doc, fields, credit=0):
+    # credit: asientos que vuelven al contador del mapa con esta escritura
+    result = await db[SEAT_MAPS].update_one(
+        {"_id": doc["_id"], "version": doc["version"]},
+        {"$set": fields, "$inc": {"version": 1, "available_seats": credit}},
+    )
+    return result.modified_count == 1
+
+async def hold_seats(db, showtime_id, seats, ttl_seconds):
+    seats = sorted(set(seats))
+    doc = await load_seat_map(db, showtime_id)
+    if any(seat < 0 or seat >= doc["capacity"] for seat in seats):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Seats must be between 0 and {doc['capacity'] - 1}")
+    # La reserva descuenta del inventario con la misma condicion que /book; las
+    # reservas vencidas que esta escritura poda vuelven al contador
+    showtime = await db["showtimes"].find_one_and_update(
+        {"_id": showtime_id, "available_seats": {"$gte": len(seats)}},
+        {"$inc": {"available_seats": -len(seats), "version": 1}},
+        projection={"_id": 1},
+    )
+    if showtime is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Not enough seats available for showtime {showtime_id}")
+    try:
+        for attempt in range(MAX_RETRIES):
+            if attempt:
+                doc = await load_seat_map(db, showtime_id)
+            now = utc_now()
+            holds = active_holds(doc, now)
+            sold = doc["sold"]
+            held = held_bitmap(doc["capacity"], holds)
+            taken = [seat for seat in seats if is_set(sold, seat) or is_set(held, seat)]
+            if taken:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Seats {taken} are not available")
+            hold = {"hold_id": str(uuid.uuid4()), "seats": seats, "expires_at": now + timedelta(seconds=ttl_seconds)}
+            expired = held_count(doc["holds"]) - held_count(holds)
+            if await compare_and_swap(db, doc, hold_fields(doc["capacity"], holds + [hold]), expired - len(seats)):
+                if expired:
+                    await db["showtimes"].update_one({"_id": showtime_id}, {"$inc": {"available_seats": expired, "version": 1}})
+                return hold
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Seat map for showtime {showtime_id} is busy, try again")
+    except Exception:
+        await db["showtimes"].update_one({"_id": showtime_id}, {"$inc": {"available_seats": len(seats), "version": 1}})
+        raise
+
+def find_hold(doc, hold_id):
+    hold = next((hold for hold in active_holds(doc, utc_now()) if hold["hold_id"] == hold_id), None)
+    if hold is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Hold with ID {hold_id} not found or expired")
+    return hold
+
+async def confirm_hold(db, showtime_id, hold_id):
+    # Los asientos ya se descontaron del inventario al reservar
+    for _ in range(MAX_RETRIES):
+        doc = await load_seat_map(db, showtime_id)
+        hold = find_hold(doc, hold_id)
+        sold = bytearray(doc["sold"])
+        set_bits(sold, hold["seats"])
+        remaining = [other for other in active_holds(doc, utc_now()) if other["hold_id"] != hold_id]
+        expired = held_count(doc["holds"]) - held_count(remaining) - len(hold["seats"])
+        if await compare_and_swap(db, doc, {"sold": bytes(sold), **hold_fields(doc["capacity"], remaining)}, expired):
+            if expired:
+                await db["showtimes"].update_one({"_id": showtime_id}, {"$inc": {"available_seats": expired, "version": 1}})
+            doc.update(sold=bytes(sold), holds=remaining, available_seats=doc["available_seats"] + expired)
+            return doc
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Seat map for showtime {showtime_id} is busy, try again")
+
+async def release_hold(db, showtime_id, hold_id):
+    for _ in range(MAX_RETRIES):
+        doc = await load_seat_map(db, showtime_id)
+        holds = active_holds(doc, utc_now())
+        remaining = [hold for hold in holds if hold["hold_id"] != hold_id]
+        if len(remaining) == len(holds):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Hold with ID {hold_id} not found or expired")
+        # Vuelven la reserva liberada y las vencidas que se podan
+        credit = held_count(doc["holds"]) - held_count(remaining)
+        if await compare_and_swap(db, doc, hold_fields(doc["capacity"], remaining), credit):
+            await db["showtimes"].update_one({"_id": showtime_id}, {"$inc": {"available_seats": credit, "version": 1}})
+            return
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Seat map for showtime {showtime_id} is busy, try again")
+
+async def reclaim_expired_holds(db, batch_size=RECLAIM_BATCH_SIZE):
+    # Solo visita los mapas con alguna reserva vencida gracias al indice sobre next_expiry
+    now = utc_now()
+    reclaimed = 0
+    cursor = db[SEAT_MAPS].find({"next_expiry": {"$lte": now}}, limit=batch_size)
+    async for doc in cursor:
+        holds = active_holds(doc, now)
+        # Si hay conflicto, otra escritura ya poda las reservas vencidas
+        credit = held_count(doc["holds"]) - held_count(holds)
+        if await compare_and_swap(db, doc, hold_fields(doc["capacity"], holds), credit):
+            await db["showtimes"].update_one({"_id": doc["_id"]}, {"$inc": {"available_seats": credit, "version": 1}})
+            reclaimed += len(doc["holds"]) - len(holds)
+    return reclaimed